@@ -17,6 +17,12 @@ def create_container(testing: bool = False) -> Container:
     return container
 
 
+def ensure_indexes(container: Container) -> None:
+    container.users_service().ensure_indexes()
+    container.transactions_service().ensure_indexes()
+    container.arima_states().ensure_indexes()
+
+
 def create_app(container: Container | None = None) -> Flask:
     app = Flask(__name__)
     if not container:
@@ -24,6 +30,8 @@ def create_app(container: Container | None = None) -> Flask:
     app.testing = container.config.testing()
     app.logger.setLevel(container.config.log_level())
     app.container = container
+    if not app.testing:
+        container.user_cache().start_listener()
     app.wsgi_app = ProxyFix(
         app.wsgi_app,
         x_for=container.config.xff_trusted_proxy_depth,
@@ -1,32 +1,128 @@
-from celery import shared_task
+import logging
+from datetime import date, datetime, timezone
+
+from celery import chord, shared_task
 from dependency_injector.wiring import Provide, inject
+from redis import Redis
+from redis.exceptions import LockError
 
 from ..containers import Container
-from ..services.email import EmailService
+from ..services.batching import chunked
+from ..services.email import EmailService, PredictionsReport
 from ..services.messages import MessageStorage
 from ..services.predictions import PredictionPeriod
+from ..services.users import UsersService
 
+_NOTIFY_RECENT_MESSAGES_LOCK_NAME = "notify_recent_messages_lock"
+_NOTIFY_RECENT_MESSAGES_LOCK_TIMEOUT = 60 * 60
+_NOTIFY_RECENT_MESSAGES_MAX_RETRIES = 5
 
-@shared_task(ignore_result=True)
+
+@shared_task(
+    ignore_result=True,
+    autoretry_for=(Exception,),
+    max_retries=_NOTIFY_RECENT_MESSAGES_MAX_RETRIES,
+    retry_backoff=True,
+)
 @inject
 def notify_recent_messages(
     email_service: EmailService = Provide[Container.email_service],
     message_storage: MessageStorage = Provide[Container.message_storage],
+    cache: Redis = Provide[Container.cache],
 ):
-    email_service.notify_recent_messages(message_storage)
+    lock = cache.lock(
+        _NOTIFY_RECENT_MESSAGES_LOCK_NAME,
+        timeout=_NOTIFY_RECENT_MESSAGES_LOCK_TIMEOUT,
+    )
+    if not lock.acquire(blocking=False):
+        logging.info("Recent messages notification is already running")
+        return
+    try:
+        email_service.notify_recent_messages(message_storage)
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logging.warning("Recent messages notification outlived its lock")
+    if len(message_storage) >= message_storage.storage_size_limit:
+        notify_recent_messages.delay()
+
+
+def schedule_recent_messages_notification(message_storage: MessageStorage) -> None:
+    notify_recent_messages.delay()
 
 
 @shared_task(ignore_result=True)
 @inject
 def send_week_predictions(
-    email_service: EmailService = Provide[Container.email_service],
+    scheduled_date: str | None = None,
+    users_service: UsersService = Provide[Container.users_service],
+    chunk_size: int = Provide[Container.config.prediction_chunk_size],
 ):
-    email_service.send_predictions(PredictionPeriod.WEEK)
+    schedule_predictions(
+        PredictionPeriod.WEEK, users_service, chunk_size, scheduled_date
+    )
 
 
 @shared_task(ignore_result=True)
 @inject
 def send_month_predictions(
-    email_service: EmailService = Provide[Container.email_service],
+    scheduled_date: str | None = None,
+    users_service: UsersService = Provide[Container.users_service],
+    chunk_size: int = Provide[Container.config.prediction_chunk_size],
 ):
-    email_service.send_predictions(PredictionPeriod.MONTH)
+    schedule_predictions(
+        PredictionPeriod.MONTH, users_service, chunk_size, scheduled_date
+    )
+
+
+def schedule_predictions(
+    period: PredictionPeriod,
+    users_service: UsersService,
+    chunk_size: int,
+    scheduled_date: str | None = None,
+) -> None:
+    if scheduled_date:
+        run_date = date.fromisoformat(scheduled_date)
+    else:
+        run_date = datetime.now(timezone.utc).date()
+    account_ids = users_service.get_account_ids({"subscribed_to_predictions": True})
+    chunks = list(chunked(account_ids, chunk_size))
+    if not chunks:
+        logging.info("No subscribers for %s predictions", period)
+        return
+    run_id = f"{period}:{run_date.isoformat()}"
+    header = [send_predictions_chunk.s(chunk, period, run_id) for chunk in chunks]
+    chord(header)(report_predictions.s(period, run_id))
+    logging.info(
+        "Scheduled %s predictions run %s in %d chunks", period, run_id, len(chunks)
+    )
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+@inject
+def send_predictions_chunk(
+    account_ids: list[int],
+    period: str,
+    run_id: str,
+    email_service: EmailService = Provide[Container.email_service],
+) -> PredictionsReport:
+    return email_service.send_predictions(PredictionPeriod(period), account_ids, run_id)
+
+
+@shared_task(ignore_result=True)
+def report_predictions(
+    reports: list[PredictionsReport],
+    period: str,
+    run_id: str,
+) -> None:
+    logging.info(
+        "Predictions run %s sent %d %s predictions in %d chunks, "
+        "%d failed, %d skipped",
+        run_id,
+        sum(report["sent"] for report in reports),
+        period,
+        len(reports),
+        sum(report["failed"] for report in reports),
+        sum(report["skipped"] for report in reports),
+    )
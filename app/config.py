@@ -73,6 +73,10 @@ class Settings(BaseSettings):
     mail_port: int | None
     mail_user: str | None
     mail_password: str | None
+    mail_max_connections: int = 4
+    mail_max_messages_per_connection: int = 100
+    mail_digest_batch_size: int | None = None
+    recipients_batch_size: int = 1000
 
     celery_broker_url: AnyUrl | None
     celery_result_backend: AnyUrl | None
@@ -93,6 +97,27 @@ class Settings(BaseSettings):
 
     message_storage_max_size: int = 100
 
+    user_cache_max_size: int = 10000
+    user_cache_ttl: int = 60
+    user_cache_channel: str | None = "user_cache_invalidation"
+    token_cache_max_size: int = 10000
+    token_cache_ttl: int = 300
+    credentials_cache_ttl: int = 60 * 60
+    credentials_cache_tombstone_ttl: int = 10
+    credentials_cache_stats_flush_interval: float = 10
+    credentials_rpc_coalesce_window: float = 0
+    credentials_rpc_coalesce_max_size: int = 100
+    credentials_rpc_max_batch_size: int = 100
+
+    prediction_max_workers: int | None = None
+    prediction_chunk_size: int = 100
+    prediction_run_ttl: int = 7 * 24 * 60 * 60
+    prediction_cache_ttl: int = 32 * 24 * 60 * 60
+    prediction_min_arima_observations: int = 16
+    prediction_arima_max_order: int = 3
+    prediction_arima_maxiter: int = 50
+    prediction_arima_search_interval: int = 4
+
     mq_url: AmqpDsn | None
     mq_users_exchange: ExchangeConfig = ExchangeConfig(name="users_exchange")
     mq_transactions_exchange: ExchangeConfig = ExchangeConfig(
@@ -16,10 +16,16 @@ class MessageContext:
     method: Basic.Deliver
     properties: pika.BasicProperties
     body: bytes
+    deferred: bool = False
 
 
 class Consumer(metaclass=ABCMeta):
-    def __init__(self, connection: pika.BaseConnection, queue: QueueConfig) -> None:
+    def __init__(
+        self,
+        connection: pika.BaseConnection,
+        queue: QueueConfig,
+        prefetch_count: int | None = None,
+    ) -> None:
         self.connection = connection
         self.channel = connection.channel()
         self.channel.exchange_declare(
@@ -30,12 +36,17 @@ class Consumer(metaclass=ABCMeta):
         self.channel.queue_declare(queue.name, durable=queue.durable)
         for routing_key in queue.bindings:
             self.channel.queue_bind(queue.name, queue.exchange.name, routing_key)
+        if prefetch_count:
+            self.channel.basic_qos(prefetch_count=prefetch_count)
         self.channel.basic_consume(queue.name, self.__callback)
 
     @abstractmethod
     def process_message(self, context: MessageContext) -> None:
         ...
 
+    def defer_message(self, context: MessageContext) -> None:
+        context.deferred = True
+
     def acknowledge_positive(self, context: MessageContext) -> None:
         context.channel.basic_ack(context.method.delivery_tag)
 
@@ -63,7 +74,8 @@ class Consumer(metaclass=ABCMeta):
         context = MessageContext(channel, method, properties, body)
         try:
             self.process_message(context)
-            self.acknowledge_positive(context)
+            if not context.deferred:
+                self.acknowledge_positive(context)
         except Exception as exc:
             logging.error("%s - %s", type(exc).__name__, exc)
 
@@ -3,6 +3,7 @@ from pydantic import ValidationError, parse_raw_as
 
 from ..config import QueueConfig
 from ..models import Transaction
+from ..services.prediction_cache import PredictionCache
 from ..services.transactions import TransactionsService
 from .base import Consumer, MessageContext
 
@@ -13,9 +14,11 @@ class TransactionsAddedConsumer(Consumer):
         connection: pika.BaseConnection,
         queue: QueueConfig,
         transactions_service: TransactionsService,
+        prediction_cache: PredictionCache,
     ) -> None:
         super().__init__(connection, queue)
         self.transactions_service = transactions_service
+        self.prediction_cache = prediction_cache
 
     def process_message(self, context: MessageContext) -> None:
         try:
@@ -23,4 +26,9 @@ class TransactionsAddedConsumer(Consumer):
         except ValidationError:
             self.reject_message(context)
             raise
-        self.transactions_service.add_transactions(transactions)
+        try:
+            self.transactions_service.add_transactions(transactions)
+        finally:
+            self.prediction_cache.invalidate(
+                transaction.account_id for transaction in transactions
+            )
@@ -4,6 +4,7 @@ import pika
 
 from ..config import QueueConfig
 from ..services.exceptions import NotFound
+from ..services.prediction_cache import PredictionCache
 from ..services.transactions import TransactionsService
 from .base import Consumer, MessageContext
 
@@ -14,14 +15,20 @@ class TransactionsDeletedConsumer(Consumer):
         connection: pika.BaseConnection,
         queue: QueueConfig,
         transactions_service: TransactionsService,
+        prediction_cache: PredictionCache,
     ) -> None:
         super().__init__(connection, queue)
         self.transactions_service = transactions_service
+        self.prediction_cache = prediction_cache
 
     def process_message(self, context: MessageContext) -> None:
         try:
             transactions = json.loads(context.body)
-            self.transactions_service.delete_transactions(transactions)
+            account_ids = self.transactions_service.get_account_ids(transactions)
+            try:
+                self.transactions_service.delete_transactions(transactions)
+            finally:
+                self.prediction_cache.invalidate(account_ids)
         except (json.JSONDecodeError, NotFound):
             self.reject_message(context)
             raise
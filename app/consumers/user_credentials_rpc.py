@@ -1,7 +1,10 @@
+import logging
+
 import pika
+from pydantic import BaseModel, parse_raw_as
 
 from ..config import QueueConfig
-from ..models import UserCredentialsResponse
+from ..models import UserCredentialsBatchResponse, UserCredentialsResponse
 from ..services.exceptions import NotFound
 from ..services.users import UsersService
 from .base import Consumer, MessageContext
@@ -13,30 +16,109 @@ class UserCredentialsRpc(Consumer):
         connection: pika.BaseConnection,
         queue: QueueConfig,
         users_service: UsersService,
+        coalesce_window: float = 0,
+        coalesce_max_size: int = 100,
+        max_batch_size: int = 100,
     ) -> None:
-        super().__init__(connection, queue)
+        super().__init__(
+            connection,
+            queue,
+            prefetch_count=coalesce_max_size if coalesce_window > 0 else None,
+        )
         self.users_service = users_service
+        self.coalesce_window = coalesce_window
+        self.coalesce_max_size = coalesce_max_size
+        self.max_batch_size = max_batch_size
+        self._pending_requests: list[tuple[int, MessageContext]] = []
+        self._flush_timer: object | None = None
 
     def process_message(self, context: MessageContext) -> None:
         try:
-            account_id = int(context.body)
+            request = self._parse_request(context.body)
         except ValueError:
             self.reject_message(context)
             raise
+        if isinstance(request, list):
+            self._process_batch(request, context)
+        elif self.coalesce_window > 0:
+            self._defer_request(request, context)
+        else:
+            self._process_single(request, context)
+
+    def flush_pending_requests(self) -> None:
+        if self._flush_timer is not None:
+            self.connection.remove_timeout(self._flush_timer)
+            self._flush_timer = None
+        pending_requests, self._pending_requests = self._pending_requests, []
+        if not pending_requests:
+            return
+        try:
+            credentials = self.users_service.get_credentials_many(
+                account_id for account_id, _ in pending_requests
+            )
+        except Exception as exc:
+            logging.error("%s - %s", type(exc).__name__, exc)
+            for _, context in pending_requests:
+                self.skip_message(context)
+            return
+        for account_id, context in pending_requests:
+            user_credentials = credentials.get(account_id)
+            response = UserCredentialsResponse(
+                success=user_credentials is not None,
+                result=user_credentials,
+            )
+            try:
+                self._send_response(response, context)
+                self.acknowledge_positive(context)
+            except Exception as exc:
+                logging.error("%s - %s", type(exc).__name__, exc)
+                self.skip_message(context)
+
+    def _parse_request(self, body: bytes) -> int | list[int]:
+        try:
+            return int(body)
+        except ValueError:
+            return parse_raw_as(list[int], body)
+
+    def _process_single(self, account_id: int, context: MessageContext) -> None:
         try:
-            user = self.users_service.get_user_by_id(account_id)
+            credentials = self.users_service.get_credentials(account_id)
         except NotFound:
             self._send_response(UserCredentialsResponse(success=False), context)
             self.acknowledge_positive(context)
             raise
-        response = UserCredentialsResponse(success=True, result=user.credentials)
+        response = UserCredentialsResponse(success=True, result=credentials)
         self._send_response(response, context)
 
-    def _send_response(
-        self,
-        response: UserCredentialsResponse,
-        context: MessageContext,
-    ) -> None:
+    def _process_batch(self, account_ids: list[int], context: MessageContext) -> None:
+        if len(account_ids) > self.max_batch_size:
+            response = UserCredentialsBatchResponse(success=False, result={})
+            self._send_response(response, context)
+            self.acknowledge_positive(context)
+            raise ValueError(
+                f"Batch of {len(account_ids)} accounts exceeds "
+                f"the limit of {self.max_batch_size}"
+            )
+        credentials = self.users_service.get_credentials_many(account_ids)
+        response = UserCredentialsBatchResponse(
+            success=True,
+            result={
+                account_id: credentials.get(account_id) for account_id in account_ids
+            },
+        )
+        self._send_response(response, context)
+
+    def _defer_request(self, account_id: int, context: MessageContext) -> None:
+        self.defer_message(context)
+        self._pending_requests.append((account_id, context))
+        if len(self._pending_requests) >= self.coalesce_max_size:
+            self.flush_pending_requests()
+        elif self._flush_timer is None:
+            self._flush_timer = self.connection.call_later(
+                self.coalesce_window, self.flush_pending_requests
+            )
+
+    def _send_response(self, response: BaseModel, context: MessageContext) -> None:
         context.channel.basic_publish(
             exchange="",
             routing_key=context.properties.reply_to,
@@ -2,6 +2,7 @@ import pika
 
 from ..config import QueueConfig
 from ..services.exceptions import NotFound
+from ..services.user_cache import UserCache
 from ..services.users import UsersService
 from .base import Consumer, MessageContext
 
@@ -12,14 +13,17 @@ class UserDeletedConsumer(Consumer):
         connection: pika.BaseConnection,
         queue: QueueConfig,
         users_service: UsersService,
+        user_cache: UserCache,
     ) -> None:
         super().__init__(connection, queue)
         self.users_service = users_service
+        self.user_cache = user_cache
 
     def process_message(self, context: MessageContext) -> None:
         try:
             account_id = int(context.body)
             self.users_service.delete_user(account_id)
+            self.user_cache.invalidate(account_id)
         except (ValueError, NotFound):
             self.reject_message(context)
             raise
@@ -14,10 +14,17 @@ from .consumers.transactions_deleted import TransactionsDeletedConsumer
 from .consumers.user_created import UserCreatedConsumer
 from .consumers.user_credentials_rpc import UserCredentialsRpc
 from .consumers.user_deleted import UserDeletedConsumer
+from .services.arima_states import ArimaStateStorage
+from .services.credentials_cache import CredentialsCache
+from .services.delivery import EmailSenderPool
 from .services.email import EmailService
-from .services.messages import RedisMessageStorage
-from .services.predictions import PredictionsService
+from .services.messages import JsonMessageSerializer, RedisMessageStorage
+from .services.prediction_cache import PredictionCache
+from .services.prediction_runs import PredictionRunLog
+from .services.predictions import ModelSettings, PredictionsService
+from .services.token_cache import VerifiedTokenCache
 from .services.transactions import TransactionsService
+from .services.user_cache import UserCache
 from .services.users import UsersService
 
 
@@ -50,14 +57,60 @@ class Container(containers.DeclarativeContainer):
 
     cache = providers.Singleton(redis.from_url, config.cache_url)
 
-    users_service = providers.Factory(UsersService, db)
+    credentials_cache = providers.Singleton(
+        CredentialsCache,
+        cache,
+        config.credentials_cache_ttl,
+        config.credentials_cache_tombstone_ttl,
+        config.credentials_cache_stats_flush_interval,
+    )
+    users_service = providers.Factory(
+        UsersService,
+        db,
+        config.recipients_batch_size,
+        credentials_cache,
+    )
+    user_cache = providers.Singleton(
+        UserCache,
+        config.user_cache_max_size,
+        config.user_cache_ttl,
+        cache,
+        config.user_cache_channel,
+    )
+    token_cache = providers.Singleton(
+        VerifiedTokenCache,
+        config.token_cache_max_size,
+        config.token_cache_ttl,
+    )
     transactions_service = providers.Factory(TransactionsService, db)
-    predictions_service = providers.Factory(PredictionsService, transactions_service)
+    prediction_cache = providers.Singleton(
+        PredictionCache,
+        cache,
+        config.prediction_cache_ttl,
+    )
+    prediction_model_settings = providers.Singleton(
+        ModelSettings,
+        min_arima_observations=config.prediction_min_arima_observations,
+        arima_max_order=config.prediction_arima_max_order,
+        arima_maxiter=config.prediction_arima_maxiter,
+        arima_search_interval=config.prediction_arima_search_interval,
+    )
+    arima_states = providers.Factory(ArimaStateStorage, db)
+    predictions_service = providers.Factory(
+        PredictionsService,
+        transactions_service,
+        prediction_cache,
+        arima_states,
+        config.prediction_max_workers,
+        prediction_model_settings,
+    )
 
+    message_serializer = providers.Singleton(JsonMessageSerializer)
     message_storage = providers.Singleton(
         RedisMessageStorage,
         cache,
         config.message_storage_max_size,
+        message_serializer,
     )
 
     jinja_environment = jinja2.Environment(
@@ -74,12 +127,25 @@ class Container(containers.DeclarativeContainer):
         templates_html=jinja_environment,
         templates_text=jinja_environment,
     )
+    email_sender_pool = providers.Factory(
+        EmailSenderPool,
+        email_connection.provider,
+        config.mail_max_connections,
+        config.mail_max_messages_per_connection,
+    )
+    prediction_runs = providers.Singleton(
+        PredictionRunLog,
+        cache,
+        config.prediction_run_ttl,
+    )
     email_service = providers.Singleton(
         EmailService,
-        email_connection,
+        email_sender_pool,
         users_service,
-        message_storage,
         predictions_service,
+        prediction_runs,
+        jinja_environment,
+        config.mail_digest_batch_size,
     )
 
     mq_params = providers.Singleton(pika.URLParameters, config.mq_url)
@@ -96,24 +162,30 @@ class Container(containers.DeclarativeContainer):
         mq_connection,
         queue_config.provided.call(config.mq_user_deleted_queue),
         users_service,
+        user_cache,
     )
     user_credentials_rpc = providers.Factory(
         UserCredentialsRpc,
         mq_connection,
         queue_config.provided.call(config.mq_user_credentials_rpc_queue),
         users_service,
+        config.credentials_rpc_coalesce_window,
+        config.credentials_rpc_coalesce_max_size,
+        config.credentials_rpc_max_batch_size,
     )
     transactions_added_consumer = providers.Factory(
         TransactionsAddedConsumer,
         mq_connection,
         queue_config.provided.call(config.mq_transactions_added_queue),
         transactions_service,
+        prediction_cache,
     )
     transactions_deleted_consumer = providers.Factory(
         TransactionsDeletedConsumer,
         mq_connection,
         queue_config.provided.call(config.mq_transactions_deleted_queue),
         transactions_service,
+        prediction_cache,
     )
     message_sent_consumer = providers.Factory(
         MessageSentConsumer,
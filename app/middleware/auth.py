@@ -12,6 +12,8 @@ from werkzeug.exceptions import BadRequest, Unauthorized
 from ..containers import Container
 from ..models import JwtTokenPayload, User
 from ..services import users
+from ..services.token_cache import VerifiedTokenCache
+from ..services.user_cache import UserCache
 
 
 class JwtAuthMiddleware(BaseHTTPMiddleware):
@@ -21,9 +23,13 @@ class JwtAuthMiddleware(BaseHTTPMiddleware):
     def __init__(
         self,
         users_service: users.UsersService = Provide[Container.users_service],
+        user_cache: UserCache = Provide[Container.user_cache],
+        token_cache: VerifiedTokenCache = Provide[Container.token_cache],
     ) -> None:
         super().__init__()
         self.users_service = users_service
+        self.user_cache = user_cache
+        self.token_cache = token_cache
 
     def dispatch(self, request: Request, call_next: Callable[..., Any]) -> Response:
         auth_header = request.headers.get("authorization")
@@ -39,13 +45,25 @@ class JwtAuthMiddleware(BaseHTTPMiddleware):
 
     def _authenticate_user(self, token: AnyStr) -> User:
         try:
+            verified_token = self.token_cache.get(token)
+            if verified_token:
+                user = self._get_user(verified_token.account_id)
+                if user.token == verified_token.signing_key:
+                    return user
+                self.token_cache.discard(token)
             token_payload = JwtTokenPayload.parse_obj(
                 jwt.decode(
                     token, options={"verify_signature": False}, algorithms=["HS256"]
                 )
             )
-            user = self.users_service.get_user_by_id(token_payload.account_id)
-            jwt.decode(token, user.token, algorithms=["HS256"])
+            user = self._get_user(token_payload.account_id)
+            verified_payload = jwt.decode(token, user.token, algorithms=["HS256"])
+            self.token_cache.set(
+                token, user.account_id, user.token, verified_payload.get("exp")
+            )
             return user
         except (jwt.InvalidTokenError, ValidationError, users.NotFound) as exc:
             raise BadRequest("Invalid token") from exc
+
+    def _get_user(self, account_id: int) -> User:
+        return self.user_cache.get_user(account_id, self.users_service.get_user_by_id)
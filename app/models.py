@@ -7,6 +7,12 @@ from pydantic import BaseModel, EmailStr
 T = TypeVar("T", bound=BaseModel, covariant=True)
 
 TransactionType: TypeAlias = Literal["IN", "OUT"]
+PredictionModel: TypeAlias = Literal[
+    "constant",
+    "moving_average",
+    "exponential_smoothing",
+    "arima",
+]
 
 
 class UserCredentials(BaseModel):
@@ -15,6 +21,11 @@ class UserCredentials(BaseModel):
     token: str
 
 
+class Recipient(BaseModel):
+    account_id: int
+    email: EmailStr
+
+
 class UserSettings(BaseModel):
     subscribed_to_chat: bool = False
     subscribed_to_predictions: bool = False
@@ -49,6 +60,11 @@ class UserCredentialsResponse(BaseModel):
     result: UserCredentials | None
 
 
+class UserCredentialsBatchResponse(BaseModel):
+    success: bool
+    result: dict[int, UserCredentials | None]
+
+
 class Message(BaseModel):
     id: str
     sender: str
@@ -69,3 +85,8 @@ class Transaction(BaseModel):
     transaction_type: TransactionType
     amount: Decimal
     transaction_time: datetime
+
+
+class Prediction(BaseModel):
+    amount: Decimal
+    model: PredictionModel
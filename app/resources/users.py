@@ -8,6 +8,7 @@ from werkzeug.exceptions import BadRequest, Forbidden
 
 from ..containers import Container
 from ..models import UserSettings
+from ..services.user_cache import UserCache
 from ..services.users import UsersService
 
 P = ParamSpec("P")
@@ -30,9 +31,11 @@ class Users(Resource):
     def __init__(
         self,
         users_service: UsersService = Provide[Container.users_service],
+        user_cache: UserCache = Provide[Container.user_cache],
     ) -> None:
         super().__init__()
         self.users_service = users_service
+        self.user_cache = user_cache
 
     def get(self, user_id: int):
         return request.user.settings.dict()
@@ -43,5 +46,8 @@ class Users(Resource):
         except ValidationError as exc:
             raise BadRequest(str(exc)) from exc
         updated_user = request.user.copy_with_updated_settings(settings)
-        updated_user = self.users_service.update_user(updated_user)
+        try:
+            updated_user = self.users_service.update_user(updated_user)
+        finally:
+            self.user_cache.invalidate(user_id)
         return settings.dict()
@@ -0,0 +1,63 @@
+from collections.abc import Iterable
+from dataclasses import asdict, dataclass
+from typing import Any, Mapping
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.database import Database
+
+from .indexes import sync_indexes
+
+
+@dataclass(frozen=True)
+class ArimaState:
+    order: tuple[int, int, int]
+    params: tuple[float, ...]
+    with_intercept: bool
+    aic: float
+    fits_since_search: int = 0
+
+
+class ArimaStateStorage:
+    _INDEXES = [
+        IndexModel([("account_id", ASCENDING), ("period", ASCENDING)], unique=True),
+    ]
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.collection = self.db.arima_states
+
+    def ensure_indexes(self) -> None:
+        sync_indexes(self.collection, self._INDEXES)
+
+    def get_many(
+        self,
+        account_ids: Iterable[int],
+        period: str,
+    ) -> dict[int, ArimaState]:
+        cursor = self.collection.find(
+            {"account_id": {"$in": list(account_ids)}, "period": period}
+        )
+        return {
+            document["account_id"]: self._parse_state(document) for document in cursor
+        }
+
+    def save_many(self, states: Mapping[int, ArimaState], period: str) -> None:
+        requests = [
+            UpdateOne(
+                {"account_id": account_id, "period": period},
+                {"$set": asdict(state)},
+                upsert=True,
+            )
+            for account_id, state in states.items()
+        ]
+        if requests:
+            self.collection.bulk_write(requests, ordered=False)
+
+    def _parse_state(self, document: Mapping[str, Any]) -> ArimaState:
+        return ArimaState(
+            order=tuple(document["order"]),
+            params=tuple(document["params"]),
+            with_intercept=document["with_intercept"],
+            aic=document["aic"],
+            fits_since_search=document["fits_since_search"],
+        )
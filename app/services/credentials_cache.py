@@ -0,0 +1,100 @@
+import threading
+import time
+from collections.abc import Iterable
+
+from redis import Redis
+
+from ..models import UserCredentials
+
+
+class CredentialsCache:
+    _STATS_KEY = "user_credentials_stats"
+    _TOMBSTONE = ""
+
+    def __init__(
+        self,
+        cache: Redis,
+        ttl: int,
+        tombstone_ttl: int = 10,
+        stats_flush_interval: float = 10,
+    ) -> None:
+        self.ttl = ttl
+        self.tombstone_ttl = tombstone_ttl
+        self.stats_flush_interval = stats_flush_interval
+        self._cache = cache
+        self._hits = 0
+        self._misses = 0
+        self._stats_flushed_at = time.monotonic()
+        self._stats_lock = threading.Lock()
+
+    def get(self, account_id: int) -> UserCredentials | None:
+        return self.get_many([account_id])[account_id]
+
+    def get_many(
+        self,
+        account_ids: Iterable[int],
+    ) -> dict[int, UserCredentials | None]:
+        account_ids = list(account_ids)
+        if not account_ids:
+            return {}
+        values = self._cache.mget(map(self._credentials_key, account_ids))
+        hits = sum(1 for value in values if value)
+        self._count(hits, len(values) - hits)
+        return {
+            account_id: UserCredentials.parse_raw(value) if value else None
+            for account_id, value in zip(account_ids, values)
+        }
+
+    def set(self, credentials: UserCredentials) -> None:
+        self.set_many([credentials])
+
+    def set_many(self, credentials: Iterable[UserCredentials]) -> None:
+        pipeline = self._cache.pipeline(transaction=False)
+        for user_credentials in credentials:
+            pipeline.set(
+                self._credentials_key(user_credentials.account_id),
+                user_credentials.json(),
+                ex=self.ttl,
+                nx=True,
+            )
+        pipeline.execute()
+
+    def invalidate(self, account_id: int) -> None:
+        self._cache.set(
+            self._credentials_key(account_id),
+            self._TOMBSTONE,
+            ex=self.tombstone_ttl,
+        )
+
+    def get_stats(self) -> dict[str, int]:
+        self.flush_stats()
+        stats = self._cache.hgetall(self._STATS_KEY)
+        return {
+            "hits": int(stats.get(b"hits", 0)),
+            "misses": int(stats.get(b"misses", 0)),
+        }
+
+    def flush_stats(self) -> None:
+        with self._stats_lock:
+            hits, misses = self._hits, self._misses
+            self._hits = self._misses = 0
+            self._stats_flushed_at = time.monotonic()
+        if not hits and not misses:
+            return
+        pipeline = self._cache.pipeline(transaction=False)
+        pipeline.hincrby(self._STATS_KEY, "hits", hits)
+        pipeline.hincrby(self._STATS_KEY, "misses", misses)
+        pipeline.execute()
+
+    def _count(self, hits: int, misses: int) -> None:
+        with self._stats_lock:
+            self._hits += hits
+            self._misses += misses
+            flush_due = (
+                time.monotonic() - self._stats_flushed_at >= self.stats_flush_interval
+            )
+        if flush_due:
+            self.flush_stats()
+
+    def _credentials_key(self, account_id: int) -> str:
+        return f"user_credentials:{account_id}"
@@ -0,0 +1,114 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.message import EmailMessage
+from queue import SimpleQueue
+from smtplib import SMTPServerDisconnected
+from threading import BoundedSemaphore, Lock
+from typing import Any, Callable, Iterable, TypeAlias
+
+from redmail import EmailSender
+
+_CONNECTION_ERRORS = (SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class PooledEmailSender:
+    def __init__(self, connection: EmailSender, max_messages: int) -> None:
+        self.connection = connection
+        self.max_messages = max_messages
+        self._sent_count = 0
+
+    def get_message(self, **kwargs: Any) -> EmailMessage:
+        return self.connection.get_message(**kwargs)
+
+    def send(self, **kwargs: Any) -> None:
+        self.send_message(self.get_message(**kwargs))
+
+    def send_message(self, message: EmailMessage) -> None:
+        if not self.connection.is_alive or self._sent_count >= self.max_messages:
+            self.reconnect()
+        try:
+            self.connection.send_message(message)
+        except _CONNECTION_ERRORS:
+            logging.warning("SMTP connection lost, reconnecting")
+            self.reconnect()
+            self.connection.send_message(message)
+        self._sent_count += 1
+
+    def reconnect(self) -> None:
+        self.close()
+        self.connection.connect()
+        self._sent_count = 0
+
+    def close(self) -> None:
+        if not self.connection.is_alive:
+            return
+        try:
+            self.connection.close()
+        except OSError:
+            self.connection.connection = None
+
+
+DeliveryJob: TypeAlias = Callable[[PooledEmailSender], Any]
+
+
+@dataclass
+class DeliveryReport:
+    succeeded: int = 0
+    failed: int = 0
+
+
+class EmailSenderPool:
+    def __init__(
+        self,
+        connection_factory: Callable[[], EmailSender],
+        max_connections: int,
+        max_messages_per_connection: int,
+    ) -> None:
+        self.connection_factory = connection_factory
+        self.max_connections = max_connections
+        self.max_messages_per_connection = max_messages_per_connection
+
+    def run(self, jobs: Iterable[DeliveryJob]) -> DeliveryReport:
+        report = DeliveryReport()
+        report_lock = Lock()
+        senders: SimpleQueue[PooledEmailSender] = SimpleQueue()
+        for _ in range(self.max_connections):
+            senders.put(
+                PooledEmailSender(
+                    self.connection_factory(), self.max_messages_per_connection
+                )
+            )
+        pending_jobs = BoundedSemaphore(self.max_connections * 2)
+        try:
+            with ThreadPoolExecutor(self.max_connections) as executor:
+                for job in jobs:
+                    pending_jobs.acquire()
+                    future = executor.submit(
+                        self._run_job, job, senders, report, report_lock
+                    )
+                    future.add_done_callback(lambda _: pending_jobs.release())
+        finally:
+            while not senders.empty():
+                senders.get().close()
+        return report
+
+    def _run_job(
+        self,
+        job: DeliveryJob,
+        senders: SimpleQueue[PooledEmailSender],
+        report: DeliveryReport,
+        report_lock: Lock,
+    ) -> None:
+        sender = senders.get()
+        try:
+            job(sender)
+        except Exception:
+            logging.exception("Email delivery job failed")
+            with report_lock:
+                report.failed += 1
+        else:
+            with report_lock:
+                report.succeeded += 1
+        finally:
+            senders.put(sender)
@@ -1,81 +1,190 @@
 import logging
+from functools import partial
 from smtplib import SMTPException
-from typing import Collection, Iterable
+from typing import Any, Iterable, Iterator, Mapping, TypedDict
 
-from redmail import EmailSender
+from jinja2 import Environment
 
-from ..models import Message, User
+from ..models import Prediction, Recipient
+from .batching import chunked
+from .delivery import DeliveryJob, EmailSenderPool, PooledEmailSender
+from .exceptions import DeliveryFailed, NotFound
 from .messages import MessageStorage
+from .prediction_runs import PredictionRunLog
 from .predictions import PredictionPeriod, PredictionsService
 from .users import UsersService
 
 
+class PredictionsReport(TypedDict):
+    sent: int
+    failed: int
+    skipped: int
+
+
 class EmailService:
     def __init__(
         self,
-        connection: EmailSender,
+        sender_pool: EmailSenderPool,
         users_service: UsersService,
-        message_storage: MessageStorage,
         predictions_service: PredictionsService,
+        prediction_runs: PredictionRunLog,
+        templates: Environment,
+        digest_batch_size: int | None = None,
     ) -> None:
-        self.connection = connection
+        self.sender_pool = sender_pool
         self.users_service = users_service
         self.predictions_service = predictions_service
-        message_storage.add_storage_exhausted_listener(self.notify_recent_messages)
+        self.prediction_runs = prediction_runs
+        self.templates = templates
+        self.digest_batch_size = digest_batch_size
 
     def notify_recent_messages(self, message_storage: MessageStorage) -> None:
-        subscribed_users = self.users_service.filter_users({"subscribed_to_chat": True})
+        subscribed_users = self.users_service.iter_recipients(
+            {"subscribed_to_chat": True}
+        )
         recent_messages = message_storage.get_all()
         if not recent_messages:
             return
-        with self.connection:
-            self._send_recent_messages_notifications(subscribed_users, recent_messages)
-        message_storage.clear()
+        html = self.templates.get_template("recent_messages.html").render(
+            messages=recent_messages
+        )
+        if self.digest_batch_size:
+            jobs = (
+                partial(self._send_recent_messages_batch, users, html)
+                for users in chunked(subscribed_users, self.digest_batch_size)
+            )
+        else:
+            jobs = (
+                partial(self._send_recent_messages_notification, user, html)
+                for user in subscribed_users
+            )
+        self.sender_pool.run(jobs)
+        message_storage.remove_many(message.id for message in recent_messages)
 
-    def send_predictions(self, period: PredictionPeriod) -> None:
-        subscribed_users = self.users_service.filter_users(
-            {"subscribed_to_predictions": True}
+    def send_predictions(
+        self,
+        period: PredictionPeriod,
+        account_ids: Iterable[int] | None = None,
+        run_id: str | None = None,
+    ) -> PredictionsReport:
+        filters: dict[str, Any] = {"subscribed_to_predictions": True}
+        if account_ids is not None:
+            account_ids = set(account_ids)
+            filters["account_id"] = {"$in": list(account_ids)}
+        recipients = {
+            recipient.account_id: recipient
+            for recipient in self.users_service.iter_recipients(filters)
+        }
+        report = PredictionsReport(sent=0, failed=0, skipped=0)
+        if account_ids is not None:
+            report["skipped"] += len(account_ids) - len(recipients)
+        if run_id:
+            unsent_account_ids = self.prediction_runs.filter_unsent(run_id, recipients)
+            report["skipped"] += len(recipients) - len(unsent_account_ids)
+            recipients = {
+                account_id: recipients[account_id] for account_id in unsent_account_ids
+            }
+        predictions = self.predictions_service.predict_many(recipients, period)
+        delivery_report = self.sender_pool.run(
+            self._make_prediction_jobs(recipients, predictions, period, report, run_id)
         )
-        with self.connection:
-            for recipient in subscribed_users:
-                try:
-                    self._make_and_send_prediction(recipient, period)
-                except Exception:
-                    logging.exception(
-                        "Sending prediction for account %d failed",
-                        recipient.account_id,
-                    )
+        report["sent"] = delivery_report.succeeded
+        report["failed"] += delivery_report.failed
+        return report
 
-    def _send_recent_messages_notifications(
+    def _make_prediction_jobs(
         self,
-        recipients: Iterable[User],
-        messages: Collection[Message],
-    ) -> None:
-        for user in recipients:
-            try:
-                self.connection.send(
-                    subject="New messages",
-                    receivers=[user.email],
-                    html_template="recent_messages.html",
-                    body_params={
-                        "messages": messages,
-                    },
+        recipients: Mapping[int, Recipient],
+        predictions: Iterable[tuple[int, Prediction | Exception]],
+        period: PredictionPeriod,
+        report: PredictionsReport,
+        run_id: str | None,
+    ) -> Iterator[DeliveryJob]:
+        for account_id, prediction in predictions:
+            if isinstance(prediction, NotFound):
+                logging.info(
+                    "Skipping prediction for account %d: %s", account_id, prediction
                 )
-            except SMTPException:
-                logging.exception(
-                    "Failed to send an email to the account %d",
-                    user.account_id,
+                report["skipped"] += 1
+                continue
+            if isinstance(prediction, Exception):
+                logging.error(
+                    "Sending prediction for account %d failed",
+                    account_id,
+                    exc_info=prediction,
                 )
+                report["failed"] += 1
+                continue
+            if run_id and not self.prediction_runs.claim(run_id, account_id):
+                report["skipped"] += 1
+                continue
+            recipient = recipients[account_id]
+            yield partial(self._send_prediction, recipient, period, prediction, run_id)
 
-    def _make_and_send_prediction(self, user: User, period: PredictionPeriod) -> None:
-        prediction = self.predictions_service.predict_period(user.account_id, period)
-        self.connection.send(
-            subject=f"Prediction for a {period.lower()}",
-            receivers=[user.email],
-            html_template="prediction.html",
-            body_params={
-                "period": period.lower(),
-                "amount": str(prediction),
-                "currency_symbol": "$",
-            },
-        )
+    def _send_recent_messages_batch(
+        self,
+        users: list[Recipient],
+        html: str,
+        sender: PooledEmailSender,
+    ) -> None:
+        try:
+            message = sender.get_message(
+                subject="New messages",
+                bcc=[user.email for user in users],
+                html=html,
+                use_jinja=False,
+            )
+            sender.send_message(message)
+        except SMTPException:
+            logging.exception(
+                "Failed to send a batch of %d emails, sending them one by one",
+                len(users),
+            )
+            for user in users:
+                self._send_recent_messages_notification(user, html, sender)
+
+    def _send_recent_messages_notification(
+        self,
+        user: Recipient,
+        html: str,
+        sender: PooledEmailSender,
+    ) -> None:
+        try:
+            message = sender.get_message(
+                subject="New messages",
+                receivers=[user.email],
+                html=html,
+                use_jinja=False,
+            )
+            sender.send_message(message)
+        except SMTPException:
+            logging.exception(
+                "Failed to send an email to the account %d",
+                user.account_id,
+            )
+
+    def _send_prediction(
+        self,
+        user: Recipient,
+        period: PredictionPeriod,
+        prediction: Prediction,
+        run_id: str | None,
+        sender: PooledEmailSender,
+    ) -> None:
+        try:
+            sender.send(
+                subject=f"Prediction for a {period.lower()}",
+                receivers=[user.email],
+                html_template="prediction.html",
+                body_params={
+                    "period": period.lower(),
+                    "amount": str(prediction.amount),
+                    "currency_symbol": "$",
+                },
+            )
+        except Exception as exc:
+            if run_id:
+                self.prediction_runs.release(run_id, user.account_id)
+            raise DeliveryFailed(
+                f"Sending prediction for account {user.account_id} failed"
+            ) from exc
@@ -0,0 +1,47 @@
+from concurrent.futures import Executor, Future
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+import billiard
+from billiard.einfo import ExceptionInfo, ExceptionWithTraceback
+
+_T = TypeVar("_T")
+
+
+def _set_exception(future: Future, error: BaseException | ExceptionInfo) -> None:
+    if isinstance(error, ExceptionInfo):
+        error = error.exception
+    if isinstance(error, ExceptionWithTraceback):
+        error = error.exc
+    future.set_exception(error)
+
+
+class BilliardPoolExecutor(Executor):
+    def __init__(self, max_workers: int | None = None, start_method: str = "spawn"):
+        self._pool = billiard.get_context(start_method).Pool(max_workers)
+
+    def submit(
+        self,
+        fn: Callable[..., _T],
+        /,
+        *args: Any,
+        **kwargs: Any,
+    ) -> Future[_T]:
+        future: Future[_T] = Future()
+        future.set_running_or_notify_cancel()
+        self._pool.apply_async(
+            fn,
+            args,
+            kwargs,
+            callback=future.set_result,
+            error_callback=partial(_set_exception, future),
+        )
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        if cancel_futures:
+            self._pool.terminate()
+        else:
+            self._pool.close()
+        if wait:
+            self._pool.join()
@@ -0,0 +1,16 @@
+from collections.abc import Iterable
+
+from pymongo import IndexModel
+from pymongo.collection import Collection
+
+
+def sync_indexes(
+    collection: Collection,
+    indexes: list[IndexModel],
+    obsolete_index_names: Iterable[str] = (),
+) -> None:
+    collection.create_indexes(indexes)
+    existing_index_names = collection.index_information()
+    for index_name in obsolete_index_names:
+        if index_name in existing_index_names:
+            collection.drop_index(index_name)
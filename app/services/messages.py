@@ -1,14 +1,74 @@
+import json
 from abc import ABCMeta, abstractmethod
-from collections.abc import Collection, Iterator
+from collections.abc import Collection, Iterable, Iterator
+from datetime import datetime
 from typing import Any, Callable, Generic, Self, TypeVar
 
 from redis import Redis
-from redis.lock import Lock
 
 from ..models import Message
+from .batching import chunked
 
 T = TypeVar("T")
 
+_GET_MANY_SCRIPT = """
+local messages = {}
+for _, message_key in ipairs(KEYS) do
+    local key_type = redis.call("TYPE", message_key)["ok"]
+    if key_type == "string" then
+        table.insert(messages, redis.call("GET", message_key))
+    elseif key_type == "hash" then
+        table.insert(messages, redis.call("HGETALL", message_key))
+    end
+end
+return messages
+"""
+
+_PUSH_SCRIPT = """
+local size_before = redis.call("ZCARD", KEYS[1])
+redis.call("SET", KEYS[2], ARGV[4])
+redis.call("ZADD", KEYS[1], ARGV[1], ARGV[2])
+local size = redis.call("ZCARD", KEYS[1])
+local limit = tonumber(ARGV[3])
+local exhausted = 0
+if size_before < limit and size >= limit then
+    exhausted = 1
+end
+return {size, exhausted}
+"""
+
+
+class MessageSerializer(metaclass=ABCMeta):
+    @abstractmethod
+    def dumps(self, message: Message) -> bytes:
+        ...
+
+    @abstractmethod
+    def loads(self, data: bytes) -> Message:
+        ...
+
+
+class JsonMessageSerializer(MessageSerializer):
+    def dumps(self, message: Message) -> bytes:
+        fields = [
+            message.id,
+            message.sender,
+            message.from_admin,
+            message.text,
+            message.timestamp.isoformat(),
+        ]
+        return json.dumps(fields, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def loads(self, data: bytes) -> Message:
+        message_id, sender, from_admin, text, timestamp = json.loads(data)
+        return Message.construct(
+            id=message_id,
+            sender=sender,
+            from_admin=from_admin,
+            text=text,
+            timestamp=datetime.fromisoformat(timestamp),
+        )
+
 
 class MessageStorage(Collection, Generic[T], metaclass=ABCMeta):
     def __init__(self, storage: T, storage_size_limit: int) -> None:
@@ -28,6 +88,10 @@ class MessageStorage(Collection, Generic[T], metaclass=ABCMeta):
     def remove(self, message_id: str) -> None:
         ...
 
+    @abstractmethod
+    def remove_many(self, message_ids: Iterable[str]) -> None:
+        ...
+
     @abstractmethod
     def clear(self) -> None:
         ...
@@ -49,18 +113,18 @@ class MessageStorage(Collection, Generic[T], metaclass=ABCMeta):
 class RedisMessageStorage(MessageStorage[Redis]):
     _MESSAGES_SET_KEY = "messages_set"
     _MESSAGE_KEY = "message:{id}"
-    _LOCK_NAME = "messages_lock"
-    _LOCK_TIMEOUT = 120
-    _BLOCKING_TIMEOUT = 60
+    _CHUNK_SIZE = 500
 
-    def __init__(self, storage: Redis, storage_size_limit: int) -> None:
+    def __init__(
+        self,
+        storage: Redis,
+        storage_size_limit: int,
+        serializer: MessageSerializer,
+    ) -> None:
         super().__init__(storage, storage_size_limit)
-        self._lock = Lock(
-            self._storage,
-            self._LOCK_NAME,
-            timeout=self._LOCK_TIMEOUT,
-            blocking_timeout=self._BLOCKING_TIMEOUT,
-        )
+        self.serializer = serializer
+        self._get_many_script = self._storage.register_script(_GET_MANY_SCRIPT)
+        self._push_script = self._storage.register_script(_PUSH_SCRIPT)
 
     def __len__(self) -> int:
         return int(self._storage.zcard(self._MESSAGES_SET_KEY))
@@ -78,42 +142,86 @@ class RedisMessageStorage(MessageStorage[Redis]):
         return iter(self.get_all())
 
     def get_all(self) -> Collection[Message]:
-        with self._lock:
-            messages = []
-            for message_id in self._get_message_ids():
-                parsed_message = self._get_message_by_id(message_id)
-                messages.append(parsed_message)
-            return messages
+        messages = []
+        for chunk in chunked(self._get_message_ids(), self._CHUNK_SIZE):
+            message_keys = [
+                self._MESSAGE_KEY.format(id=message_id) for message_id in chunk
+            ]
+            raw_messages = self._get_many_script(keys=message_keys)
+            messages.extend(
+                self._parse_message(raw_message) for raw_message in raw_messages
+            )
+        return messages
 
     def push(self, message: Message) -> None:
         message_key = self._MESSAGE_KEY.format(id=message.id)
-        with self._lock:
-            self._storage.hset(message_key, mapping=message.dict_of_str())
-            self._storage.zadd(
-                self._MESSAGES_SET_KEY, {message.id: message.timestamp.timestamp()}
-            )
-        if len(self) >= self.storage_size_limit:
+        _, exhausted = self._push_script(
+            keys=[self._MESSAGES_SET_KEY, message_key],
+            args=[
+                message.timestamp.timestamp(),
+                message.id,
+                self.storage_size_limit,
+                self.serializer.dumps(message),
+            ],
+        )
+        if exhausted:
             self._notify_storage_exhausted()
 
     def remove(self, message_id: str) -> None:
-        with self._lock:
-            self._storage.zrem(self._MESSAGES_SET_KEY, message_id)
-            self._storage.delete(self._MESSAGE_KEY.format(id=message_id))
+        self.remove_many([message_id])
+
+    def remove_many(self, message_ids: Iterable[str]) -> None:
+        for chunk in chunked(message_ids, self._CHUNK_SIZE):
+            message_keys = [
+                self._MESSAGE_KEY.format(id=message_id) for message_id in chunk
+            ]
+            pipeline = self._storage.pipeline()
+            pipeline.zrem(self._MESSAGES_SET_KEY, *chunk)
+            pipeline.unlink(*message_keys)
+            pipeline.execute()
 
     def clear(self) -> None:
-        with self._lock:
-            messages = self._get_message_ids()
-            for message_id in messages:
-                self._storage.delete(self._MESSAGE_KEY.format(id=message_id))
-            self._storage.delete(self._MESSAGES_SET_KEY)
+        self.remove_many(list(self._get_message_ids()))
+
+    def migrate_hash_layout(self) -> int:
+        migrated_count = 0
+        for chunk in chunked(self._get_message_ids(), self._CHUNK_SIZE):
+            message_keys = [
+                self._MESSAGE_KEY.format(id=message_id) for message_id in chunk
+            ]
+            pipeline = self._storage.pipeline(transaction=False)
+            for message_key in message_keys:
+                pipeline.type(message_key)
+            legacy_keys = [
+                message_key
+                for message_key, key_type in zip(message_keys, pipeline.execute())
+                if key_type == b"hash"
+            ]
+            if not legacy_keys:
+                continue
+            for message_key in legacy_keys:
+                pipeline.hgetall(message_key)
+            raw_messages = pipeline.execute()
+            for message_key, raw_message in zip(legacy_keys, raw_messages):
+                if not raw_message:
+                    continue
+                message = self._parse_legacy_message(raw_message)
+                pipeline.set(message_key, self.serializer.dumps(message), xx=True)
+            migrated_count += sum(pipeline.execute())
+        return migrated_count
 
     def _get_message_ids(self) -> Iterator[str]:
         raw_ids = self._storage.zrange(self._MESSAGES_SET_KEY, 0, -1)
         for raw_message_id in raw_ids:
             yield raw_message_id.decode()
 
-    def _get_message_by_id(self, message_id: str) -> Message:
-        raw_message = self._storage.hgetall(self._MESSAGE_KEY.format(id=message_id))
+    def _parse_message(self, raw_message: bytes | list[bytes]) -> Message:
+        if isinstance(raw_message, bytes):
+            return self.serializer.loads(raw_message)
+        fields = iter(raw_message)
+        return self._parse_legacy_message(dict(zip(fields, fields)))
+
+    def _parse_legacy_message(self, raw_message: dict[bytes, bytes]) -> Message:
         decoded_message = {
             key.decode(): value.decode() for key, value in raw_message.items()
         }
@@ -0,0 +1,71 @@
+from collections.abc import Iterable
+
+from redis import Redis
+
+from ..models import Prediction
+
+
+class PredictionCache:
+    def __init__(self, cache: Redis, ttl: int) -> None:
+        self.ttl = ttl
+        self._cache = cache
+
+    def get(self, account_id: int, period: str) -> tuple[int, Prediction | None]:
+        return self.get_many([account_id], period)[account_id]
+
+    def get_many(
+        self,
+        account_ids: Iterable[int],
+        period: str,
+    ) -> dict[int, tuple[int, Prediction | None]]:
+        account_ids = list(account_ids)
+        pipeline = self._cache.pipeline(transaction=False)
+        for account_id in account_ids:
+            pipeline.get(self._version_key(account_id))
+            pipeline.get(self._prediction_key(account_id, period))
+        replies = pipeline.execute()
+        entries = {}
+        for index, account_id in enumerate(account_ids):
+            version = int(replies[index * 2] or 0)
+            entries[account_id] = (
+                version,
+                self._parse_prediction(replies[index * 2 + 1], version),
+            )
+        return entries
+
+    def set(
+        self,
+        account_id: int,
+        period: str,
+        version: int,
+        prediction: Prediction,
+    ) -> None:
+        pipeline = self._cache.pipeline(transaction=False)
+        pipeline.set(
+            self._prediction_key(account_id, period),
+            f"{version}:{prediction.model}:{prediction.amount}",
+            ex=self.ttl,
+        )
+        pipeline.expire(self._version_key(account_id), self.ttl)
+        pipeline.execute()
+
+    def invalidate(self, account_ids: Iterable[int]) -> None:
+        pipeline = self._cache.pipeline(transaction=False)
+        for account_id in set(account_ids):
+            pipeline.incr(self._version_key(account_id))
+            pipeline.expire(self._version_key(account_id), self.ttl)
+        pipeline.execute()
+
+    def _parse_prediction(self, value: bytes | None, version: int) -> Prediction | None:
+        if value is None:
+            return None
+        cached_version, model, amount = value.decode().split(":")
+        if int(cached_version) != version:
+            return None
+        return Prediction(amount=amount, model=model)
+
+    def _version_key(self, account_id: int) -> str:
+        return f"prediction_version:{account_id}"
+
+    def _prediction_key(self, account_id: int, period: str) -> str:
+        return f"prediction:{account_id}:{period}"
@@ -0,0 +1,31 @@
+from collections.abc import Iterable
+
+from redis import Redis
+
+
+class PredictionRunLog:
+    def __init__(self, cache: Redis, ttl: int) -> None:
+        self.ttl = ttl
+        self._cache = cache
+
+    def filter_unsent(self, run_id: str, account_ids: Iterable[int]) -> list[int]:
+        account_ids = list(account_ids)
+        if not account_ids:
+            return []
+        sent_flags = self._cache.smismember(self._sent_key(run_id), account_ids)
+        return [
+            account_id for account_id, sent in zip(account_ids, sent_flags) if not sent
+        ]
+
+    def claim(self, run_id: str, account_id: int) -> bool:
+        pipeline = self._cache.pipeline(transaction=False)
+        pipeline.sadd(self._sent_key(run_id), account_id)
+        pipeline.expire(self._sent_key(run_id), self.ttl)
+        added, _ = pipeline.execute()
+        return bool(added)
+
+    def release(self, run_id: str, account_id: int) -> None:
+        self._cache.srem(self._sent_key(run_id), account_id)
+
+    def _sent_key(self, run_id: str) -> str:
+        return f"prediction_run:{run_id}:sent"
@@ -1,13 +1,35 @@
+import multiprocessing
+import os
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from decimal import Decimal
 from enum import StrEnum, auto
-from typing import Callable
+from typing import Callable, Collection, Iterable, Iterator, Sequence, TypeAlias
 
+import numpy as np
+import numpy.typing as npt
 import pandas as pd
 import pmdarima
 
+from ..models import Prediction, PredictionModel
+from .arima_states import ArimaState, ArimaStateStorage
+from .batching import chunked
 from .exceptions import NotFound
-from .transactions import TransactionsService
+from .executors import BilliardPoolExecutor
+from .prediction_cache import PredictionCache
+from .transactions import (
+    AccountDailyTotalArrays,
+    DailyTotalArrays,
+    TransactionFilters,
+    TransactionsService,
+)
 
 
 class PredictionPeriod(StrEnum):
@@ -15,42 +37,308 @@ class PredictionPeriod(StrEnum):
     MONTH = auto()
 
 
+TimeSeries: TypeAlias = npt.NDArray[np.float64]
+PeriodBins: TypeAlias = Callable[[npt.NDArray[np.datetime64]], npt.NDArray[np.int64]]
+
+_EPOCH_MONDAY = 4
+
+
+def week_bins(dates: npt.NDArray[np.datetime64]) -> npt.NDArray[np.int64]:
+    days = dates.astype(np.int64)
+    return (days + (_EPOCH_MONDAY - days) % 7) // 7
+
+
+def month_bins(dates: npt.NDArray[np.datetime64]) -> npt.NDArray[np.int64]:
+    return dates.astype("datetime64[M]").astype(np.int64)
+
+
+def resample(daily_totals: DailyTotalArrays, bins: PeriodBins) -> TimeSeries:
+    period_bins = bins(daily_totals.dates)
+    period_bins -= period_bins.min()
+    return np.bincount(period_bins, weights=daily_totals.total_cents) / 100
+
+
+def resample_many(
+    daily_totals: AccountDailyTotalArrays,
+    bins: PeriodBins,
+) -> Iterator[tuple[int, TimeSeries]]:
+    account_ids = daily_totals.account_ids
+    if not len(account_ids):
+        return
+    starts = np.flatnonzero(np.r_[True, account_ids[1:] != account_ids[:-1]])
+    group_sizes = np.diff(np.r_[starts, len(account_ids)])
+    groups = np.repeat(np.arange(len(starts)), group_sizes)
+    period_bins = bins(daily_totals.dates)
+    first_bins = np.minimum.reduceat(period_bins, starts)
+    lengths = np.maximum.reduceat(period_bins, starts) - first_bins + 1
+    offsets = np.r_[0, np.cumsum(lengths)]
+    positions = offsets[groups] + period_bins - first_bins[groups]
+    totals = np.bincount(
+        positions, weights=daily_totals.total_cents, minlength=offsets[-1]
+    )
+    totals /= 100
+    for group, start in enumerate(starts):
+        yield int(account_ids[start]), totals[offsets[group] : offsets[group + 1]]
+
+
+_PERIOD_SETTINGS: dict[PredictionPeriod, tuple[int, PeriodBins]] = {
+    PredictionPeriod.WEEK: (365, week_bins),
+    PredictionPeriod.MONTH: (730, month_bins),
+}
+
+
+@dataclass(frozen=True)
+class ModelSettings:
+    min_arima_observations: int = 16
+    min_arima_density: float = 0.5
+    moving_average_window: int = 4
+    smoothing_level: float = 0.3
+    arima_max_order: int = 3
+    arima_maxiter: int = 50
+    arima_search_interval: int = 4
+    arima_max_aic_increase: float = 0.5
+
+
+FittedPrediction: TypeAlias = tuple[Prediction, ArimaState | None]
+
+
+def make_prediction(
+    time_series: TimeSeries,
+    settings: ModelSettings,
+    arima_state: ArimaState | None = None,
+) -> FittedPrediction:
+    amount, model, arima_state = _fit_model(
+        pd.Series(time_series), settings, arima_state
+    )
+    return Prediction(amount=round(Decimal(amount), 2), model=model), arima_state
+
+
+def make_predictions(
+    inputs: Sequence[tuple[TimeSeries, ArimaState | None]],
+    settings: ModelSettings,
+) -> list[FittedPrediction | Exception]:
+    results: list[FittedPrediction | Exception] = []
+    for time_series, arima_state in inputs:
+        try:
+            results.append(make_prediction(time_series, settings, arima_state))
+        except Exception as exc:
+            results.append(exc)
+    return results
+
+
+def _fit_model(
+    time_series: pd.Series,
+    settings: ModelSettings,
+    arima_state: ArimaState | None,
+) -> tuple[float, PredictionModel, ArimaState | None]:
+    if time_series.nunique() == 1:
+        return time_series.iloc[-1], "constant", None
+    if len(time_series) < settings.min_arima_observations:
+        window = time_series.iloc[-settings.moving_average_window :]
+        return window.mean(), "moving_average", None
+    if (time_series != 0).mean() < settings.min_arima_density:
+        smoothed = time_series.ewm(alpha=settings.smoothing_level, adjust=False)
+        return smoothed.mean().iloc[-1], "exponential_smoothing", None
+    model, arima_state = _fit_arima(time_series, settings, arima_state)
+    return model.predict(1).iloc[0], "arima", arima_state
+
+
+def _fit_arima(
+    time_series: pd.Series,
+    settings: ModelSettings,
+    arima_state: ArimaState | None,
+) -> tuple[pmdarima.ARIMA, ArimaState]:
+    if arima_state and arima_state.fits_since_search < settings.arima_search_interval:
+        model = pmdarima.ARIMA(
+            arima_state.order,
+            start_params=np.array(arima_state.params),
+            maxiter=settings.arima_maxiter,
+            suppress_warnings=True,
+            with_intercept=arima_state.with_intercept,
+        )
+        try:
+            model.fit(time_series)
+        except (ValueError, np.linalg.LinAlgError):
+            pass
+        else:
+            aic = model.aic() / len(time_series)
+            if aic <= arima_state.aic + settings.arima_max_aic_increase:
+                return model, ArimaState(
+                    order=arima_state.order,
+                    params=tuple(map(float, model.params())),
+                    with_intercept=arima_state.with_intercept,
+                    aic=arima_state.aic,
+                    fits_since_search=arima_state.fits_since_search + 1,
+                )
+    start_order = min(2, settings.arima_max_order)
+    model = pmdarima.auto_arima(
+        time_series,
+        start_p=start_order,
+        start_q=start_order,
+        max_p=settings.arima_max_order,
+        max_q=settings.arima_max_order,
+        seasonal=False,
+        stepwise=True,
+        maxiter=settings.arima_maxiter,
+        error_action="ignore",
+        suppress_warnings=True,
+    )
+    return model, ArimaState(
+        order=model.order,
+        params=tuple(map(float, model.params())),
+        with_intercept=model.with_intercept,
+        aic=float(model.aic() / len(time_series)),
+    )
+
+
 class PredictionsService:
-    def __init__(self, transactions_service: TransactionsService) -> None:
+    _FETCH_CHUNK_SIZE = 500
+    _FIT_CHUNK_SIZE = 8
+
+    def __init__(
+        self,
+        transactions_service: TransactionsService,
+        prediction_cache: PredictionCache,
+        arima_states: ArimaStateStorage,
+        max_workers: int | None = None,
+        model_settings: ModelSettings | None = None,
+    ) -> None:
         self.transactions_service = transactions_service
+        self.prediction_cache = prediction_cache
+        self.arima_states = arima_states
+        self.model_settings = model_settings or ModelSettings()
+        self.max_workers = max_workers or os.cpu_count() or 1
 
-    def predict_period(self, account_id: int, period: PredictionPeriod) -> Decimal:
-        prediction_funcs: dict[PredictionPeriod, Callable[[int], Decimal]] = {
-            PredictionPeriod.WEEK: self.predict_week,
-            PredictionPeriod.MONTH: self.predict_month,
-        }
-        return prediction_funcs[period](account_id)
+    def predict_period(self, account_id: int, period: PredictionPeriod) -> Prediction:
+        version, prediction = self.prediction_cache.get(account_id, period)
+        if prediction is not None:
+            return prediction
+        history_days, bins = _PERIOD_SETTINGS[period]
+        time_series = resample(self._get_totals(account_id, history_days), bins)
+        arima_state = self.arima_states.get_many([account_id], period).get(account_id)
+        prediction, arima_state = make_prediction(
+            time_series, self.model_settings, arima_state
+        )
+        if arima_state:
+            self.arima_states.save_many({account_id: arima_state}, period)
+        self.prediction_cache.set(account_id, period, version, prediction)
+        return prediction
+
+    def predict_week(self, account_id: int) -> Prediction:
+        return self.predict_period(account_id, PredictionPeriod.WEEK)
 
-    def predict_week(self, account_id: int) -> Decimal:
-        daily_totals = self._get_totals(account_id, days=365)
-        return self._make_prediction(daily_totals, "W-MON")
+    def predict_month(self, account_id: int) -> Prediction:
+        return self.predict_period(account_id, PredictionPeriod.MONTH)
 
-    def predict_month(self, account_id: int) -> Decimal:
-        daily_totals = self._get_totals(account_id, days=730)
-        return self._make_prediction(daily_totals, "M")
+    def predict_many(
+        self,
+        account_ids: Iterable[int],
+        period: PredictionPeriod,
+    ) -> Iterator[tuple[int, Prediction | Exception]]:
+        pending: dict[Future[list[FittedPrediction | Exception]], list[int]] = {}
+        versions: dict[int, int] = {}
+        fitted_states: dict[int, ArimaState] = {}
+        with self._create_executor() as executor:
+            for chunk in chunked(account_ids, self._FETCH_CHUNK_SIZE):
+                cached_predictions = self.prediction_cache.get_many(chunk, period)
+                chunk_versions = {}
+                for account_id, (version, prediction) in cached_predictions.items():
+                    if prediction is None:
+                        chunk_versions[account_id] = version
+                    else:
+                        yield account_id, prediction
+                versions.update(chunk_versions)
+                arima_states = self.arima_states.get_many(chunk_versions, period)
+                fit_inputs = []
+                for account_id, time_series in self._get_time_series_many(
+                    chunk_versions, period
+                ):
+                    if isinstance(time_series, Exception):
+                        yield account_id, time_series
+                    else:
+                        fit_inputs.append(
+                            (account_id, time_series, arima_states.get(account_id))
+                        )
+                for fit_chunk in chunked(fit_inputs, self._FIT_CHUNK_SIZE):
+                    future = executor.submit(
+                        make_predictions,
+                        [(time_series, state) for _, time_series, state in fit_chunk],
+                        self.model_settings,
+                    )
+                    pending[future] = [account_id for account_id, _, _ in fit_chunk]
+                    if len(pending) >= self.max_workers * 2:
+                        yield from self._collect_completed(
+                            pending, period, versions, fitted_states
+                        )
+                self.arima_states.save_many(fitted_states, period)
+                fitted_states.clear()
+            while pending:
+                yield from self._collect_completed(
+                    pending, period, versions, fitted_states
+                )
+            self.arima_states.save_many(fitted_states, period)
+
+    def _create_executor(self) -> Executor:
+        if multiprocessing.current_process().daemon:
+            return BilliardPoolExecutor(self.max_workers)
+        return ProcessPoolExecutor(
+            self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
 
-    def _get_totals(self, account_id: int, days: int) -> pd.DataFrame:
-        daily_totals = self.transactions_service.compute_daily_total(
+    def _collect_completed(
+        self,
+        pending: dict[Future[list[FittedPrediction | Exception]], list[int]],
+        period: PredictionPeriod,
+        versions: dict[int, int],
+        fitted_states: dict[int, ArimaState],
+    ) -> Iterator[tuple[int, Prediction | Exception]]:
+        completed, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in completed:
+            account_ids = pending.pop(future)
+            try:
+                results = future.result()
+            except Exception as exc:
+                results = [exc] * len(account_ids)
+            for account_id, result in zip(account_ids, results):
+                version = versions.pop(account_id)
+                if isinstance(result, Exception):
+                    yield account_id, result
+                    continue
+                prediction, arima_state = result
+                if arima_state:
+                    fitted_states[account_id] = arima_state
+                self.prediction_cache.set(account_id, period, version, prediction)
+                yield account_id, prediction
+
+    def _get_totals(self, account_id: int, days: int) -> DailyTotalArrays:
+        daily_totals = self.transactions_service.compute_daily_total_arrays(
             {
                 "account_id": account_id,
                 "transaction_type": "OUT",
                 "start_time": datetime.now() - timedelta(days=days),
             }
         )
-        dataset = pd.DataFrame(daily_totals)
-        if not len(dataset):
+        if not len(daily_totals.dates):
             raise NotFound("No transactions fot given period")
-        dataset["date"] = pd.to_datetime(dataset["date"])
-        dataset.set_index("date", inplace=True)
-        return dataset
-
-    def _make_prediction(self, dataset: pd.DataFrame, resample_rule: str) -> Decimal:
-        time_series = dataset["total_amount"].resample(resample_rule).sum().fillna(0)
-        model = pmdarima.auto_arima(time_series)
-        predictions = model.predict(1)
-        return round(Decimal(predictions.iloc[0]), 2)
+        return daily_totals
+
+    def _get_time_series_many(
+        self,
+        account_ids: Collection[int],
+        period: PredictionPeriod,
+    ) -> Iterator[tuple[int, TimeSeries | Exception]]:
+        history_days, bins = _PERIOD_SETTINGS[period]
+        filters: TransactionFilters = {
+            "transaction_type": "OUT",
+            "start_time": datetime.now() - timedelta(days=history_days),
+        }
+        daily_totals = self.transactions_service.compute_daily_total_arrays_by_account(
+            account_ids, filters
+        )
+        missing_account_ids = set(account_ids)
+        for account_id, time_series in resample_many(daily_totals, bins):
+            missing_account_ids.discard(account_id)
+            yield account_id, time_series
+        for account_id in missing_account_ids:
+            yield account_id, NotFound("No transactions fot given period")
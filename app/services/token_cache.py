@@ -0,0 +1,61 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import AnyStr, NamedTuple
+
+
+class VerifiedToken(NamedTuple):
+    account_id: int
+    signing_key: str
+    expires_at: float
+
+
+class VerifiedTokenCache:
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._tokens: OrderedDict[bytes, VerifiedToken] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: AnyStr) -> VerifiedToken | None:
+        token_digest = self._digest(token)
+        with self._lock:
+            verified_token = self._tokens.get(token_digest)
+            if not verified_token:
+                return None
+            if verified_token.expires_at <= time.time():
+                del self._tokens[token_digest]
+                return None
+            self._tokens.move_to_end(token_digest)
+            return verified_token
+
+    def set(
+        self,
+        token: AnyStr,
+        account_id: int,
+        signing_key: str,
+        expires_at: float | None = None,
+    ) -> None:
+        expires_at = min(time.time() + self.ttl, expires_at or float("inf"))
+        token_digest = self._digest(token)
+        with self._lock:
+            self._tokens[token_digest] = VerifiedToken(
+                account_id, signing_key, expires_at
+            )
+            self._tokens.move_to_end(token_digest)
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+
+    def discard(self, token: AnyStr) -> None:
+        with self._lock:
+            self._tokens.pop(self._digest(token), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tokens.clear()
+
+    def _digest(self, token: AnyStr) -> bytes:
+        if isinstance(token, str):
+            token = token.encode()
+        return hashlib.sha256(token).digest()
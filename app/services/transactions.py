@@ -1,16 +1,36 @@
+import logging
 from collections.abc import Collection
-from datetime import date, datetime
-from decimal import Decimal
-from typing import Any, Iterable, Iterator, NotRequired, TypedDict
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import ROUND_HALF_EVEN, Decimal
+from operator import itemgetter
+from typing import (
+    Any,
+    Iterable,
+    Iterator,
+    Mapping,
+    NamedTuple,
+    NotRequired,
+    Sequence,
+    TypeAlias,
+    TypedDict,
+)
 
+import numpy as np
+import numpy.typing as npt
 from bson.decimal128 import Decimal128
-from pymongo import ASCENDING, IndexModel, ReplaceOne
+from pymongo import ASCENDING, IndexModel, ReplaceOne, UpdateOne
 from pymongo.database import Database
+from pymongo.errors import BulkWriteError
 
 from ..models import Transaction, TransactionType
+from .batching import chunked
 from .exceptions import NotFound
+from .indexes import sync_indexes
 
-_DATE_FORMAT = "%Y-%m-%d"
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+_DailyTotalKey: TypeAlias = tuple[int, TransactionType, datetime]
+_DUPLICATE_KEY_ERROR = 11000
 
 
 class TransactionFilters(TypedDict):
@@ -25,17 +45,119 @@ class TransactionTotalByDate(TypedDict):
     total_amount: Decimal
 
 
+class DailyTotalArrays(NamedTuple):
+    dates: npt.NDArray[np.datetime64]
+    total_cents: npt.NDArray[np.int64]
+
+
+class AccountDailyTotalArrays(NamedTuple):
+    account_ids: npt.NDArray[np.int64]
+    dates: npt.NDArray[np.datetime64]
+    total_cents: npt.NDArray[np.int64]
+
+
+class DailyTotalMismatch(TypedDict):
+    account_id: int
+    transaction_type: TransactionType
+    date: date
+    expected_total: Decimal
+    stored_total: Decimal
+
+
+def _to_cents(amount: Decimal) -> int:
+    return int((amount * 100).to_integral_value(ROUND_HALF_EVEN))
+
+
+def _from_cents(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
+def _create_daily_total_arrays(
+    results: Sequence[Mapping[str, Any]],
+) -> DailyTotalArrays:
+    count = len(results)
+    ordinals = np.fromiter(
+        (result["date"].toordinal() for result in results), np.int64, count
+    )
+    total_cents = np.fromiter(
+        (result["total_cents"] for result in results), np.int64, count
+    )
+    dates = (ordinals - _EPOCH_ORDINAL).astype("datetime64[D]")
+    return DailyTotalArrays(dates, total_cents)
+
+
+def _to_utc(timestamp: datetime) -> datetime:
+    if timestamp.tzinfo:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _start_of_day(timestamp: datetime) -> datetime:
+    return datetime.combine(_to_utc(timestamp).date(), time())
+
+
+def _start_of_next_day(timestamp: datetime) -> datetime:
+    day = _start_of_day(timestamp)
+    if day == _to_utc(timestamp):
+        return day
+    return day + timedelta(days=1)
+
+
+def _with_time_range(
+    filters: TransactionFilters,
+    start_time: datetime | None,
+    end_time: datetime | None,
+) -> TransactionFilters:
+    time_range_filters = filters.copy()
+    time_range_filters.pop("start_time", None)
+    time_range_filters.pop("end_time", None)
+    if start_time:
+        time_range_filters["start_time"] = start_time
+    if end_time:
+        time_range_filters["end_time"] = end_time
+    return time_range_filters
+
+
 class TransactionsService:
+    _INDEXES = [
+        IndexModel("transaction_id", unique=True),
+        IndexModel(
+            [
+                ("account_id", ASCENDING),
+                ("transaction_type", ASCENDING),
+                ("transaction_time", ASCENDING),
+            ]
+        ),
+    ]
+    _DAILY_TOTALS_INDEXES = [
+        IndexModel(
+            [
+                ("account_id", ASCENDING),
+                ("transaction_type", ASCENDING),
+                ("date", ASCENDING),
+            ],
+            unique=True,
+        ),
+    ]
+    _OBSOLETE_INDEX_NAMES = ["account_id_1", "transaction_type_1"]
+    _DAILY_TOTAL_ENTRY_PROJECTION = {
+        "account_id": 1,
+        "transaction_type": 1,
+        "transaction_time": 1,
+        "transaction_id": 1,
+        "amount": 1,
+    }
+    _ACCOUNTS_CHUNK_SIZE = 500
+    _REBUILD_ATTEMPTS = 3
+
     def __init__(self, db: Database):
         self.db = db
         self.collection = self.db.transactions
-        self.collection.create_indexes(
-            [
-                IndexModel("transaction_id", unique=True),
-                IndexModel("transaction_type"),
-                IndexModel("account_id"),
-            ]
-        )
+        self.daily_totals_collection = self.db.daily_totals
+
+    def ensure_indexes(self) -> None:
+        sync_indexes(self.collection, self._INDEXES, self._OBSOLETE_INDEX_NAMES)
+        sync_indexes(self.daily_totals_collection, self._DAILY_TOTALS_INDEXES)
 
     @staticmethod
     def serialize_transaction(transaction: Transaction) -> dict[str, Any]:
@@ -49,26 +171,68 @@ class TransactionsService:
         for transaction in cursor:
             yield Transaction(**transaction)
 
+    def get_account_ids(self, transaction_ids: Iterable[int]) -> set[int]:
+        query = {"transaction_id": {"$in": list(transaction_ids)}}
+        return set(self.collection.distinct("account_id", query))
+
     def compute_daily_total(
         self,
         filters: TransactionFilters,
     ) -> Iterator[TransactionTotalByDate]:
-        query = self._create_query(filters)
-        pipeline = self._create_daily_total_pipeline(query)
-        cursor = self.collection.aggregate(pipeline)
-        for result in cursor:
-            yield TransactionTotalByDate(
-                date=datetime.strptime(result["date"], _DATE_FORMAT).date(),
-                total_amount=result["total_amount"].to_decimal(),
-            )
+        for result in self._fetch_daily_totals(filters):
+            yield self._parse_daily_total(result)
+
+    def compute_daily_total_arrays(
+        self,
+        filters: TransactionFilters,
+    ) -> DailyTotalArrays:
+        return _create_daily_total_arrays(self._fetch_daily_totals(filters))
+
+    def compute_daily_total_arrays_by_account(
+        self,
+        account_ids: Iterable[int],
+        filters: TransactionFilters,
+    ) -> AccountDailyTotalArrays:
+        results = self._fetch_daily_totals(filters, list(account_ids))
+        result_account_ids = np.fromiter(
+            (result["account_id"] for result in results), np.int64, len(results)
+        )
+        return AccountDailyTotalArrays(
+            result_account_ids, *_create_daily_total_arrays(results)
+        )
+
+    def explain_daily_totals(
+        self,
+        filters: TransactionFilters,
+        account_ids: Iterable[int] | None = None,
+    ) -> dict[str, Any]:
+        full_day_filters, _ = self._split_partial_days(filters)
+        query = self._create_daily_totals_query(full_day_filters or filters)
+        if account_ids is not None:
+            query["account_id"] = {"$in": list(account_ids)}
+        pipeline = self._create_daily_total_pipeline(query, account_ids is not None)
+        return self.db.command(
+            "aggregate",
+            self.daily_totals_collection.name,
+            pipeline=pipeline,
+            explain=True,
+        )
 
     def add_transactions(self, transactions: Iterable[Transaction]) -> None:
+        serialized_transactions = {
+            transaction.transaction_id: self.serialize_transaction(transaction)
+            for transaction in transactions
+        }
+        previous_transactions = self.collection.find(
+            {"transaction_id": {"$in": list(serialized_transactions)}}
+        )
+        self._remove_daily_total_entries(previous_transactions)
+        self._add_daily_total_entries(serialized_transactions.values())
         requests = []
-        for transaction in transactions:
-            serialized_transaction = self.serialize_transaction(transaction)
+        for transaction_id, serialized_transaction in serialized_transactions.items():
             requests.append(
                 ReplaceOne(
-                    {"transaction_id": transaction.transaction_id},
+                    {"transaction_id": transaction_id},
                     serialized_transaction,
                     upsert=True,
                 )
@@ -76,12 +240,327 @@ class TransactionsService:
         self.collection.bulk_write(requests)
 
     def delete_transactions(self, transaction_ids: Collection[int]) -> None:
-        delete_result = self.collection.delete_many(
-            {"transaction_id": {"$in": list(transaction_ids)}}
-        )
+        query = {"transaction_id": {"$in": list(transaction_ids)}}
+        self._remove_daily_total_entries(self.collection.find(query))
+        delete_result = self.collection.delete_many(query)
         if delete_result.deleted_count != len(transaction_ids):
             raise NotFound("Some transactions not found")
 
+    def rebuild_daily_totals(
+        self, account_ids: Iterable[int] | None = None
+    ) -> set[int]:
+        changed_account_ids: set[int] = set()
+        for chunk in self._chunk_account_ids(account_ids):
+            for _ in range(self._REBUILD_ATTEMPTS):
+                conflict_count = self._rebuild_daily_totals_chunk(
+                    chunk, changed_account_ids
+                )
+                if not conflict_count:
+                    break
+            else:
+                logging.warning(
+                    "%d daily totals kept changing during rebuild", conflict_count
+                )
+        return changed_account_ids
+
+    def backfill_daily_totals(self) -> set[int]:
+        legacy_account_ids = self.daily_totals_collection.distinct(
+            "account_id", {"entries": {"$exists": False}}
+        )
+        missing_account_ids = set(self.collection.distinct("account_id")) - set(
+            self.daily_totals_collection.distinct("account_id")
+        )
+        account_ids = missing_account_ids.union(legacy_account_ids)
+        if not account_ids:
+            return set()
+        return self.rebuild_daily_totals(sorted(account_ids))
+
+    def check_daily_totals(
+        self,
+        account_ids: Iterable[int] | None = None,
+    ) -> Iterator[DailyTotalMismatch]:
+        for chunk in self._chunk_account_ids(account_ids):
+            account_query = {"account_id": {"$in": chunk}}
+            expected_totals = {
+                key: sum(entries.values())
+                for key, entries in self._collect_daily_total_entries(
+                    account_query
+                ).items()
+            }
+            stored_totals = {
+                self._daily_total_key(daily_total): daily_total["total_cents"]
+                for daily_total in self.daily_totals_collection.find(
+                    {**account_query, "transaction_count": {"$gt": 0}}
+                )
+            }
+            for key in sorted(expected_totals.keys() | stored_totals.keys()):
+                expected_cents = expected_totals.get(key, 0)
+                stored_cents = stored_totals.get(key, 0)
+                if expected_cents == stored_cents:
+                    continue
+                account_id, transaction_type, day = key
+                yield DailyTotalMismatch(
+                    account_id=account_id,
+                    transaction_type=transaction_type,
+                    date=day.date(),
+                    expected_total=_from_cents(expected_cents),
+                    stored_total=_from_cents(stored_cents),
+                )
+
+    def _chunk_account_ids(
+        self,
+        account_ids: Iterable[int] | None,
+    ) -> Iterator[list[int]]:
+        if account_ids is None:
+            account_ids = sorted(
+                set(self.collection.distinct("account_id"))
+                | set(self.daily_totals_collection.distinct("account_id"))
+            )
+        return chunked(account_ids, self._ACCOUNTS_CHUNK_SIZE)
+
+    def _rebuild_daily_totals_chunk(
+        self,
+        account_ids: list[int],
+        changed_account_ids: set[int],
+    ) -> int:
+        account_query = {"account_id": {"$in": account_ids}}
+        stored_totals = {
+            self._daily_total_key(daily_total): daily_total
+            for daily_total in self.daily_totals_collection.find(account_query)
+        }
+        expected_entries = self._collect_daily_total_entries(account_query)
+        requests = []
+        for key in expected_entries.keys() | stored_totals.keys():
+            entries = expected_entries.get(key, {})
+            daily_total = stored_totals.get(key, {})
+            expected_total = {
+                "entries": entries,
+                "total_cents": sum(entries.values()),
+                "transaction_count": len(entries),
+            }
+            if all(
+                daily_total.get(field) == expected_total[field]
+                for field in expected_total
+            ):
+                continue
+            account_id, transaction_type, day = key
+            changed_account_ids.add(account_id)
+            requests.append(
+                UpdateOne(
+                    {
+                        "account_id": account_id,
+                        "transaction_type": transaction_type,
+                        "date": day,
+                        "revision": daily_total.get("revision"),
+                    },
+                    {
+                        "$set": {
+                            **expected_total,
+                            "revision": daily_total.get("revision", 0) + 1,
+                        }
+                    },
+                    upsert=True,
+                )
+            )
+        if not requests:
+            return 0
+        try:
+            self.daily_totals_collection.bulk_write(requests, ordered=False)
+        except BulkWriteError as exc:
+            return len(self._get_duplicate_key_errors(exc))
+        return 0
+
+    def _collect_daily_total_entries(
+        self,
+        query: dict[str, Any],
+    ) -> dict[_DailyTotalKey, dict[str, int]]:
+        daily_total_entries: dict[_DailyTotalKey, dict[str, int]] = {}
+        cursor = self.collection.find(query, self._DAILY_TOTAL_ENTRY_PROJECTION)
+        for transaction in cursor:
+            key = self._transaction_daily_total_key(transaction)
+            entries = daily_total_entries.setdefault(key, {})
+            entries[str(transaction["transaction_id"])] = _to_cents(
+                transaction["amount"].to_decimal()
+            )
+        return daily_total_entries
+
+    def _add_daily_total_entries(
+        self, transactions: Iterable[Mapping[str, Any]]
+    ) -> None:
+        requests = []
+        for transaction in transactions:
+            entry_field = f"entries.{transaction['transaction_id']}"
+            amount_cents = _to_cents(transaction["amount"].to_decimal())
+            requests.append(
+                UpdateOne(
+                    {
+                        **self._daily_total_filter(transaction),
+                        entry_field: {"$exists": False},
+                    },
+                    {
+                        "$set": {entry_field: amount_cents},
+                        "$inc": {
+                            "total_cents": amount_cents,
+                            "transaction_count": 1,
+                            "revision": 1,
+                        },
+                    },
+                    upsert=True,
+                )
+            )
+        for _ in range(2):
+            if not requests:
+                return
+            try:
+                self.daily_totals_collection.bulk_write(requests, ordered=False)
+                return
+            except BulkWriteError as exc:
+                requests = [
+                    requests[error["index"]]
+                    for error in self._get_duplicate_key_errors(exc)
+                ]
+
+    def _remove_daily_total_entries(
+        self,
+        transactions: Iterable[Mapping[str, Any]],
+    ) -> None:
+        requests = []
+        for transaction in transactions:
+            entry_field = f"entries.{transaction['transaction_id']}"
+            amount_cents = _to_cents(transaction["amount"].to_decimal())
+            requests.append(
+                UpdateOne(
+                    {
+                        **self._daily_total_filter(transaction),
+                        entry_field: amount_cents,
+                    },
+                    {
+                        "$unset": {entry_field: ""},
+                        "$inc": {
+                            "total_cents": -amount_cents,
+                            "transaction_count": -1,
+                            "revision": 1,
+                        },
+                    },
+                )
+            )
+        if requests:
+            self.daily_totals_collection.bulk_write(requests, ordered=False)
+
+    def _get_duplicate_key_errors(self, exc: BulkWriteError) -> list[dict[str, Any]]:
+        errors = exc.details["writeErrors"]
+        if any(error["code"] != _DUPLICATE_KEY_ERROR for error in errors):
+            raise exc
+        return errors
+
+    def _daily_total_filter(self, transaction: Mapping[str, Any]) -> dict[str, Any]:
+        account_id, transaction_type, day = self._transaction_daily_total_key(
+            transaction
+        )
+        return {
+            "account_id": account_id,
+            "transaction_type": transaction_type,
+            "date": day,
+        }
+
+    def _transaction_daily_total_key(
+        self,
+        transaction: Mapping[str, Any],
+    ) -> _DailyTotalKey:
+        return (
+            transaction["account_id"],
+            transaction["transaction_type"],
+            _start_of_day(transaction["transaction_time"]),
+        )
+
+    def _daily_total_key(self, daily_total: Mapping[str, Any]) -> _DailyTotalKey:
+        return (
+            daily_total["account_id"],
+            daily_total["transaction_type"],
+            daily_total["date"],
+        )
+
+    def _fetch_daily_totals(
+        self,
+        filters: TransactionFilters,
+        account_ids: list[int] | None = None,
+    ) -> list[dict[str, Any]]:
+        group_by_account = account_ids is not None
+        full_day_filters, partial_day_filters = self._split_partial_days(filters)
+        results = []
+        if full_day_filters is not None:
+            query = self._create_daily_totals_query(full_day_filters)
+            if account_ids is not None:
+                query["account_id"] = {"$in": account_ids}
+            pipeline = self._create_daily_total_pipeline(query, group_by_account)
+            results = list(self.daily_totals_collection.aggregate(pipeline))
+        if not partial_day_filters:
+            return results
+        results += self._aggregate_partial_days(partial_day_filters, account_ids)
+        if group_by_account:
+            return sorted(results, key=itemgetter("account_id", "date"))
+        return sorted(results, key=itemgetter("date"))
+
+    def _split_partial_days(
+        self,
+        filters: TransactionFilters,
+    ) -> tuple[TransactionFilters | None, list[TransactionFilters]]:
+        start_time = filters.get("start_time")
+        end_time = filters.get("end_time")
+        start_time = _to_utc(start_time) if start_time else None
+        end_time = _to_utc(end_time) if end_time else None
+        full_days_start = _start_of_next_day(start_time) if start_time else None
+        full_days_end = _start_of_day(end_time) if end_time else None
+        if full_days_start and full_days_end and full_days_start > full_days_end:
+            return None, [_with_time_range(filters, start_time, end_time)]
+        partial_day_filters = []
+        if start_time and full_days_start != start_time:
+            partial_day_filters.append(
+                _with_time_range(
+                    filters,
+                    start_time,
+                    min(full_days_start, end_time) if end_time else full_days_start,
+                )
+            )
+        if end_time and full_days_end != end_time:
+            partial_day_filters.append(
+                _with_time_range(
+                    filters,
+                    max(full_days_end, start_time) if start_time else full_days_end,
+                    end_time,
+                )
+            )
+        if full_days_start and full_days_end and full_days_start == full_days_end:
+            return None, partial_day_filters
+        return (
+            _with_time_range(filters, full_days_start, full_days_end),
+            partial_day_filters,
+        )
+
+    def _aggregate_partial_days(
+        self,
+        partial_day_filters: Iterable[TransactionFilters],
+        account_ids: list[int] | None,
+    ) -> list[dict[str, Any]]:
+        totals: dict[tuple[int | None, datetime], int] = {}
+        for filters in partial_day_filters:
+            query = self._create_query(filters)
+            if account_ids is not None:
+                query["account_id"] = {"$in": account_ids}
+            cursor = self.collection.find(query, self._DAILY_TOTAL_ENTRY_PROJECTION)
+            for transaction in cursor:
+                key = (
+                    transaction["account_id"] if account_ids is not None else None,
+                    _start_of_day(transaction["transaction_time"]),
+                )
+                totals[key] = totals.get(key, 0) + _to_cents(
+                    transaction["amount"].to_decimal()
+                )
+        return [
+            {"account_id": account_id, "date": day, "total_cents": total_cents}
+            for (account_id, day), total_cents in totals.items()
+        ]
+
     def _create_query(self, filters: TransactionFilters) -> dict[str, Any]:
         query_filters = filters.copy()
         start_time = query_filters.pop("start_time", None)
@@ -97,27 +576,50 @@ class TransactionsService:
             query_filters["transaction_time"] = time_range_filters
         return query_filters
 
-    def _create_daily_total_pipeline(self, query: dict[str, Any]) -> list[dict]:
+    def _create_daily_totals_query(self, filters: TransactionFilters) -> dict[str, Any]:
+        query = self._create_query(filters)
+        time_range_filters = query.pop("transaction_time", {})
+        if time_range_filters:
+            query["date"] = time_range_filters
+        query["transaction_count"] = {"$gt": 0}
+        return query
+
+    def _parse_daily_total(self, result: Mapping[str, Any]) -> TransactionTotalByDate:
+        return TransactionTotalByDate(
+            date=result["date"].date(),
+            total_amount=_from_cents(result["total_cents"]),
+        )
+
+    def _create_daily_total_pipeline(
+        self,
+        query: dict[str, Any],
+        group_by_account: bool = False,
+    ) -> list[dict]:
+        group_key: dict[str, Any] = {"date": "$date"}
+        projection: dict[str, Any] = {
+            "_id": 0,
+            "date": "$_id.date",
+            "total_cents": 1,
+        }
+        sort: dict[str, Any] = {"date": ASCENDING}
+        if group_by_account:
+            group_key["account_id"] = "$account_id"
+            projection["account_id"] = "$_id.account_id"
+            sort = {"account_id": ASCENDING, **sort}
         return [
             {
                 "$match": query,
             },
             {
                 "$group": {
-                    "_id": {
-                        "$dateToString": {
-                            "format": _DATE_FORMAT,
-                            "date": "$transaction_time",
-                        }
-                    },
-                    "total_amount": {"$sum": "$amount"},
+                    "_id": group_key,
+                    "total_cents": {"$sum": "$total_cents"},
                 }
             },
             {
-                "$project": {
-                    "_id": 0,
-                    "date": "$_id",
-                    "total_amount": 1,
-                }
+                "$project": projection,
+            },
+            {
+                "$sort": sort,
             },
         ]
@@ -0,0 +1,82 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from redis import Redis
+from redis.client import PubSub, PubSubWorkerThread
+
+from ..models import User
+
+
+class UserCache:
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        cache: Redis | None = None,
+        channel: str | None = None,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.channel = channel
+        self._cache = cache
+        self._users: OrderedDict[int, tuple[float, User]] = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_user(self, account_id: int, load: Callable[[int], User]) -> User:
+        with self._lock:
+            entry = self._users.get(account_id)
+            if entry and entry[0] > time.monotonic():
+                self._users.move_to_end(account_id)
+                return entry[1]
+            generation = self._generation
+        user = load(account_id)
+        with self._lock:
+            if generation == self._generation:
+                self._users[account_id] = (time.monotonic() + self.ttl, user)
+                self._users.move_to_end(account_id)
+                while len(self._users) > self.max_size:
+                    self._users.popitem(last=False)
+        return user
+
+    def invalidate(self, account_id: int) -> None:
+        self._discard(account_id)
+        if self._cache is not None and self.channel:
+            self._cache.publish(self.channel, account_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._users.clear()
+
+    def start_listener(self, sleep_time: float = 1) -> PubSubWorkerThread | None:
+        if self._cache is None or not self.channel:
+            return None
+        pubsub = self._cache.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: self._handle_invalidation})
+        return pubsub.run_in_thread(
+            sleep_time,
+            daemon=True,
+            exception_handler=self._handle_listener_error,
+        )
+
+    def _discard(self, account_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            self._users.pop(account_id, None)
+
+    def _handle_invalidation(self, message: dict[str, Any]) -> None:
+        self._discard(int(message["data"]))
+
+    def _handle_listener_error(
+        self,
+        exc: Exception,
+        pubsub: PubSub,
+        thread: PubSubWorkerThread,
+    ) -> None:
+        logging.error("User cache listener failed: %s - %s", type(exc).__name__, exc)
+        self.clear()
+        time.sleep(thread.sleep_time)
@@ -1,28 +1,110 @@
-from typing import Any, Iterator, Mapping
+from typing import Any, Iterable, Iterator, Mapping
 
-from pymongo import ReturnDocument
+from pymongo import ASCENDING, IndexModel, ReturnDocument
 from pymongo.database import Database
 from pymongo.errors import DuplicateKeyError
 
-from ..models import User
+from ..models import Recipient, User, UserCredentials
+from .credentials_cache import CredentialsCache
 from .exceptions import AlreadyExists, NotFound
+from .indexes import sync_indexes
 
 
 class UsersService:
-    def __init__(self, db: Database):
+    _INDEXES = [
+        IndexModel("account_id", unique=True),
+        IndexModel(
+            [("subscribed_to_chat", ASCENDING), ("account_id", ASCENDING)],
+            partialFilterExpression={"subscribed_to_chat": True},
+        ),
+        IndexModel(
+            [("subscribed_to_predictions", ASCENDING), ("account_id", ASCENDING)],
+            partialFilterExpression={"subscribed_to_predictions": True},
+        ),
+    ]
+    _RECIPIENT_PROJECTION = {"account_id": 1, "email": 1, "_id": 0}
+    _CREDENTIALS_PROJECTION = {"account_id": 1, "email": 1, "token": 1, "_id": 0}
+
+    def __init__(
+        self,
+        db: Database,
+        recipients_batch_size: int = 1000,
+        credentials_cache: CredentialsCache | None = None,
+    ):
         self.db = db
+        self.recipients_batch_size = recipients_batch_size
+        self.credentials_cache = credentials_cache
         self.collection = self.db.users
-        self.collection.create_index("account_id", unique=True)
+
+    def ensure_indexes(self) -> None:
+        sync_indexes(self.collection, self._INDEXES)
 
     def get_user_by_id(self, account_id: int) -> User:
         user = self.collection.find_one({"account_id": account_id})
         return self._return_user_or_error(user)
 
+    def get_credentials(self, account_id: int) -> UserCredentials:
+        if self.credentials_cache:
+            credentials = self.credentials_cache.get(account_id)
+            if credentials:
+                return credentials
+        credentials = self.get_user_by_id(account_id).credentials
+        if self.credentials_cache:
+            self.credentials_cache.set(credentials)
+        return credentials
+
+    def get_credentials_many(
+        self,
+        account_ids: Iterable[int],
+    ) -> dict[int, UserCredentials]:
+        account_ids = set(account_ids)
+        credentials: dict[int, UserCredentials] = {}
+        if self.credentials_cache:
+            cached_credentials = self.credentials_cache.get_many(account_ids)
+            credentials = {
+                account_id: user_credentials
+                for account_id, user_credentials in cached_credentials.items()
+                if user_credentials
+            }
+        missing_account_ids = account_ids - credentials.keys()
+        if not missing_account_ids:
+            return credentials
+        cursor = self.collection.find(
+            {"account_id": {"$in": list(missing_account_ids)}},
+            self._CREDENTIALS_PROJECTION,
+        )
+        loaded = [UserCredentials.construct(**document) for document in cursor]
+        if self.credentials_cache and loaded:
+            self.credentials_cache.set_many(loaded)
+        credentials.update(
+            (user_credentials.account_id, user_credentials)
+            for user_credentials in loaded
+        )
+        return credentials
+
     def filter_users(self, filters: Mapping[str, Any]) -> Iterator[User]:
         cursor = self.collection.find(filters)
         for user in cursor:
             yield User(**user)
 
+    def iter_recipients(
+        self,
+        filters: Mapping[str, Any],
+        batch_size: int | None = None,
+    ) -> Iterator[Recipient]:
+        cursor = self.collection.find(
+            filters,
+            self._RECIPIENT_PROJECTION,
+            batch_size=batch_size or self.recipients_batch_size,
+        )
+        for recipient in cursor:
+            yield Recipient.construct(**recipient)
+
+    def get_account_ids(self, filters: Mapping[str, Any]) -> Iterator[int]:
+        cursor = self.collection.find(filters, {"account_id": 1, "_id": 0})
+        for user in cursor:
+            yield user["account_id"]
+
     def create_user(self, user: User) -> User:
         try:
             self.collection.insert_one(user.dict())
@@ -30,6 +112,8 @@ class UsersService:
             raise AlreadyExists(
                 f"Account with id({user.account_id}) already exists"
             ) from exc
+        if self.credentials_cache:
+            self.credentials_cache.set(user.credentials)
         return user
 
     def update_user(self, user: User) -> User:
@@ -38,10 +122,14 @@ class UsersService:
             {"$set": user.settings.dict()},
             return_document=ReturnDocument.AFTER,
         )
+        if self.credentials_cache:
+            self.credentials_cache.invalidate(user.account_id)
         return self._return_user_or_error(updated_user)
 
     def delete_user(self, account_id: int) -> None:
         delete_result = self.collection.delete_one({"account_id": account_id})
+        if self.credentials_cache:
+            self.credentials_cache.invalidate(account_id)
         if not delete_result.deleted_count:
             raise NotFound(f"Account with id({account_id}) not found")
 
@@ -0,0 +1,82 @@
+import argparse
+import time
+from typing import Callable
+
+import fakeredis
+import jwt
+import mongomock
+from dependency_injector import providers
+from flask.testing import FlaskClient
+
+from app import application
+from app.containers import Container
+from app.models import JwtTokenPayload
+from tests.factories import UserFactory
+
+
+def create_client() -> tuple[Container, FlaskClient, str, dict[str, str]]:
+    container = application.create_container(testing=True)
+    container.db_client.override(providers.Singleton(mongomock.MongoClient))
+    container.cache.override(providers.Singleton(fakeredis.FakeRedis))
+    container.wire()
+    user = UserFactory()
+    container.users_service().create_user(user)
+    token = jwt.encode(
+        JwtTokenPayload(account_id=user.account_id).dict()
+        | {"exp": int(time.time()) + 3600},
+        user.token,
+    )
+    client = application.create_app(container).test_client()
+    return (
+        container,
+        client,
+        f"/users/{user.account_id}",
+        {"Authorization": f"Bearer {token}"},
+    )
+
+
+def measure(
+    client: FlaskClient,
+    url: str,
+    headers: dict[str, str],
+    prepare: Callable[[], None],
+    repeat: int,
+) -> float:
+    elapsed = 0.0
+    for _ in range(repeat):
+        prepare()
+        started_at = time.perf_counter()
+        response = client.get(url, headers=headers)
+        elapsed += time.perf_counter() - started_at
+        assert response.status_code == 200
+    return elapsed / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure authenticated request latency through JwtAuthMiddleware"
+    )
+    parser.add_argument("--repeat", type=int, default=10000)
+    args = parser.parse_args()
+    container, client, url, headers = create_client()
+    token_cache = container.token_cache()
+    user_cache = container.user_cache()
+    client.get(url, headers=headers)
+
+    def clear_caches() -> None:
+        token_cache.clear()
+        user_cache.clear()
+
+    paths = {
+        "token cache hit": lambda: None,
+        "token cache miss": token_cache.clear,
+        "both caches miss": clear_caches,
+    }
+    print(f"{'path':>18} {'time, us':>12}")
+    for path, prepare in paths.items():
+        elapsed = measure(client, url, headers, prepare, args.repeat)
+        print(f"{path:>18} {elapsed * 1_000_000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import time
+
+import redis
+
+from app.models import Message
+from app.services.messages import RedisMessageStorage
+from tests.factories import MessageFactory
+
+from .message_storage import create_client, create_storage
+
+
+def save_hash_layout(client: redis.Redis, message: Message) -> None:
+    client.hset(f"message:{message.id}", mapping=message.dict_of_str())
+    client.zadd("messages_set", {message.id: message.timestamp.timestamp()})
+
+
+def measure_memory(
+    client: redis.Redis,
+    storage: RedisMessageStorage,
+    layout: str,
+) -> int:
+    total = 0
+    for message in storage.get_all():
+        message_key = f"message:{message.id}"
+        try:
+            total += client.memory_usage(message_key)
+        except redis.ResponseError:
+            if layout == "hash":
+                fields = client.hgetall(message_key).items()
+                total += sum(len(key) + len(value) for key, value in fields)
+            else:
+                total += client.strlen(message_key)
+    return total
+
+
+def measure_layout(
+    client: redis.Redis,
+    layout: str,
+    messages: list[Message],
+    repeat: int,
+) -> None:
+    storage = create_storage(client, len(messages))
+    storage.clear()
+    for message in messages:
+        if layout == "hash":
+            save_hash_layout(client, message)
+        else:
+            storage.push(message)
+    memory = measure_memory(client, storage, layout) / len(messages)
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        storage.get_all()
+    elapsed = (time.perf_counter() - started_at) / repeat
+    throughput = len(messages) / elapsed
+    print(f"{layout:>8} {len(messages):>8} {memory:>14.1f} {throughput:>16.0f}")
+    storage.clear()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare memory and get_all throughput of message layouts"
+    )
+    parser.add_argument("--url", help="Redis URL, in-memory fake is used if omitted")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    args = parser.parse_args()
+    client = create_client(args.url)
+    print(f"{'layout':>8} {'messages':>8} {'bytes/message':>14} {'messages/sec':>16}")
+    for message_count in args.sizes:
+        messages = [MessageFactory() for _ in range(message_count)]
+        for layout in ("hash", "json"):
+            measure_layout(client, layout, messages, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import time
+
+import fakeredis
+import redis
+
+from app.services.messages import JsonMessageSerializer, RedisMessageStorage
+from tests.factories import MessageFactory
+
+
+class RoundTripCounter:
+    count = 0
+
+    def send_packed_command(self, *args, **kwargs):
+        RoundTripCounter.count += 1
+        return super().send_packed_command(*args, **kwargs)
+
+
+class CountingConnection(RoundTripCounter, redis.Connection):
+    pass
+
+
+class CountingFakeConnection(RoundTripCounter, fakeredis.FakeConnection):
+    pass
+
+
+def create_client(url: str | None) -> redis.Redis:
+    if url:
+        pool = redis.ConnectionPool.from_url(url, connection_class=CountingConnection)
+    else:
+        pool = redis.ConnectionPool(
+            connection_class=CountingFakeConnection,
+            server=fakeredis.FakeServer(),
+            version=(7,),
+        )
+    return redis.Redis(connection_pool=pool)
+
+
+def create_storage(client: redis.Redis, message_count: int) -> RedisMessageStorage:
+    return RedisMessageStorage(
+        client,
+        storage_size_limit=message_count + 1,
+        serializer=JsonMessageSerializer(),
+    )
+
+
+def measure_get_all(client: redis.Redis, message_count: int, repeat: int) -> None:
+    storage = create_storage(client, message_count)
+    storage.clear()
+    for _ in range(message_count):
+        storage.push(MessageFactory())
+    storage.get_all()
+    round_trips_before = RoundTripCounter.count
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        storage.get_all()
+    elapsed = (time.perf_counter() - started_at) / repeat
+    round_trips = (RoundTripCounter.count - round_trips_before) / repeat
+    print(f"{message_count:>8} {round_trips:>12.0f} {elapsed * 1000:>12.2f}")
+    storage.clear()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measure RedisMessageStorage.get_all round trips and wall time"
+    )
+    parser.add_argument("--url", help="Redis URL, in-memory fake is used if omitted")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    args = parser.parse_args()
+    client = create_client(args.url)
+    print(f"{'messages':>8} {'round trips':>12} {'time, ms':>12}")
+    for message_count in args.sizes:
+        measure_get_all(client, message_count, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+import mongomock
+import pandas as pd
+from pymongo import MongoClient
+from pymongo.database import Database
+
+from app.services.predictions import TimeSeries, resample, week_bins
+from app.services.transactions import TransactionFilters, TransactionsService
+
+_ACCOUNT_ID = 1
+_RESAMPLE_RULE = "W-MON"
+
+
+def create_database(url: str | None) -> Database:
+    client = MongoClient(url) if url else mongomock.MongoClient()
+    return client.get_database("benchmark_predictions_input")
+
+
+def create_daily_totals(db: Database, years: int) -> TransactionFilters:
+    end = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    days = years * 365
+    db.daily_totals.delete_many({})
+    db.daily_totals.insert_many(
+        {
+            "account_id": _ACCOUNT_ID,
+            "transaction_type": "OUT",
+            "date": end - timedelta(days=day),
+            "total_cents": 1000 + day % 7 * 250,
+            "transaction_count": 1,
+        }
+        for day in range(days)
+    )
+    return {
+        "account_id": _ACCOUNT_ID,
+        "transaction_type": "OUT",
+        "start_time": end - timedelta(days=days),
+    }
+
+
+def build_from_records(
+    service: TransactionsService,
+    filters: TransactionFilters,
+) -> pd.Series:
+    dataset = pd.DataFrame(service.compute_daily_total(filters))
+    dataset["date"] = pd.to_datetime(dataset["date"])
+    dataset.set_index("date", inplace=True)
+    time_series = dataset["total_amount"].resample(_RESAMPLE_RULE).sum().fillna(0)
+    return time_series.astype(float)
+
+
+def build_from_arrays(
+    service: TransactionsService,
+    filters: TransactionFilters,
+) -> TimeSeries:
+    return resample(service.compute_daily_total_arrays(filters), week_bins)
+
+
+def measure(function: Callable[..., Any], repeat: int, *args: Any) -> float:
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        function(*args)
+    return (time.perf_counter() - started_at) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare record-based and columnar prediction input building"
+    )
+    parser.add_argument("--url", help="MongoDB URL, mongomock is used if omitted")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 2, 5, 10])
+    args = parser.parse_args()
+    db = create_database(args.url)
+    service = TransactionsService(db)
+    service.ensure_indexes()
+    print(f"{'years':>6} {'records, ms':>12} {'arrays, ms':>12}")
+    for years in args.years:
+        filters = create_daily_totals(db, years)
+        records_time = measure(build_from_records, args.repeat, service, filters)
+        arrays_time = measure(build_from_arrays, args.repeat, service, filters)
+        print(f"{years:>6} {records_time * 1000:>12.2f} {arrays_time * 1000:>12.2f}")
+    db.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import logging
+import sys
+
+from app.application import create_container, ensure_indexes
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Rebuild or verify the precomputed daily transaction totals"
+    )
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--account-id", type=int, action="append", dest="account_ids")
+    args = parser.parse_args()
+
+    container = create_container()
+    logging.basicConfig(
+        format="[%(asctime)s] [%(levelname)s]: %(message)s",
+        level=container.config.log_level(),
+    )
+    ensure_indexes(container)
+    transactions_service = container.transactions_service()
+
+    if args.command == "rebuild":
+        changed_account_ids = transactions_service.rebuild_daily_totals(
+            args.account_ids
+        )
+        container.prediction_cache().invalidate(changed_account_ids)
+        logging.info(
+            "Daily totals rebuilt, %d accounts changed", len(changed_account_ids)
+        )
+        return 0
+
+    mismatch_count = 0
+    for mismatch in transactions_service.check_daily_totals(args.account_ids):
+        mismatch_count += 1
+        logging.warning(
+            "Account %d %s on %s: expected %s, stored %s",
+            mismatch["account_id"],
+            mismatch["transaction_type"],
+            mismatch["date"],
+            mismatch["expected_total"],
+            mismatch["stored_total"],
+        )
+    logging.info("Found %d mismatched daily totals", mismatch_count)
+    return 1 if mismatch_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,24 @@
 import logging
 
-from app.application import create_container
+from app.application import create_container, ensure_indexes
+from app.celery.app import create_celery_app
+from app.celery.tasks import schedule_recent_messages_notification
 from app.consumers.entrypoint import main
 
 if __name__ == "__main__":
     container = create_container()
-    container.email_service()
+    create_celery_app(container)
+    container.message_storage().add_storage_exhausted_listener(
+        schedule_recent_messages_notification
+    )
     logging.basicConfig(
         format="(%(threadName)s) [%(asctime)s] [%(levelname)s]: %(message)s",
         level=container.config.log_level(),
     )
+    ensure_indexes(container)
+    backfilled_account_ids = container.transactions_service().backfill_daily_totals()
+    container.prediction_cache().invalidate(backfilled_account_ids)
+    logging.info("Backfilled daily totals of %d accounts", len(backfilled_account_ids))
+    migrated_count = container.message_storage().migrate_hash_layout()
+    logging.info("Migrated %d messages to the serialized layout", migrated_count)
     main()
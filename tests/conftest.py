@@ -1,3 +1,4 @@
+import os
 from unittest.mock import MagicMock
 
 import fakeredis
@@ -5,13 +6,13 @@ import mongomock
 import pytest
 from dependency_injector import providers
 from mongomock import Database
+from pymongo import MongoClient
 from redmail import EmailSender
 
 from app import application
 from app.containers import Container
 from app.models import Message, Transaction, User
 from app.services.messages import MessageStorage
-from app.services.transactions import TransactionsService
 
 from . import factories
 
@@ -43,11 +44,28 @@ def mock_email_connection(container: Container):
     container.email_connection.reset_override()
 
 
+@pytest.fixture(autouse=True)
+def indexes(container: Container, mock_database, mock_cache):
+    application.ensure_indexes(container)
+
+
 @pytest.fixture
 def db(container: Container, mock_database):
     return container.db()
 
 
+@pytest.fixture
+def mongo_db():
+    database_url = os.environ.get("TEST_DATABASE_URL")
+    if not database_url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    client = MongoClient(database_url)
+    database = client.get_database("test_notifications")
+    yield database
+    client.drop_database(database)
+    client.close()
+
+
 @pytest.fixture
 def cache(container: Container, mock_cache):
     return container.cache()
@@ -86,21 +104,15 @@ def transaction():
 
 
 @pytest.fixture
-def saved_transaction(db: Database, transaction: Transaction):
-    serialized_transaction = TransactionsService.serialize_transaction(transaction)
-    db.transactions.insert_one(serialized_transaction)
+def saved_transaction(container: Container, transaction: Transaction):
+    container.transactions_service().add_transactions([transaction])
     return transaction
 
 
 @pytest.fixture
-def saved_transactions_bulk(db: Database, request: pytest.FixtureRequest):
+def saved_transactions_bulk(container: Container, request: pytest.FixtureRequest):
     transactions = [factories.TransactionFactory() for _ in range(request.param)]
-    db.transactions.insert_many(
-        (
-            TransactionsService.serialize_transaction(transaction)
-            for transaction in transactions
-        )
-    )
+    container.transactions_service().add_transactions(transactions)
     return transactions
 
 
@@ -0,0 +1,19 @@
+from typing import Any, Iterator, Mapping
+
+
+def winning_plan_stages(explain: Mapping[str, Any]) -> set[str]:
+    stages = set()
+    for plan in _find_values(explain, "winningPlan"):
+        stages.update(_find_values(plan, "stage"))
+    return stages
+
+
+def _find_values(document: Any, key: str) -> Iterator[Any]:
+    if isinstance(document, Mapping):
+        for field, value in document.items():
+            if field == key:
+                yield value
+            yield from _find_values(value, key)
+    elif isinstance(document, list):
+        for item in document:
+            yield from _find_values(item, key)
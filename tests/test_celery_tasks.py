@@ -0,0 +1,166 @@
+import logging
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+from mongomock import Database
+from redis import Redis
+from redmail import EmailSender
+
+from app.celery import tasks
+from app.containers import Container
+from app.models import User
+from app.services.messages import MessageStorage
+from app.services.predictions import PredictionPeriod
+
+from .factories import MessageFactory, UserFactory
+
+
+@pytest.fixture
+def email_connection(container: Container):
+    return container.email_connection()
+
+
+@pytest.fixture
+def chat_subscriber(db: Database):
+    user = UserFactory(subscribed_to_chat=True)
+    db.users.insert_one(user.dict())
+    return user
+
+
+@pytest.fixture
+def full_storage(storage: MessageStorage):
+    for _ in range(storage.storage_size_limit):
+        storage.push(MessageFactory())
+    return storage
+
+
+def test_notify_recent_messages(
+    email_connection: EmailSender,
+    full_storage: MessageStorage,
+    chat_subscriber: User,
+):
+    tasks.notify_recent_messages()
+    email_connection.send_message.assert_called_once()
+    assert len(full_storage) == 0
+
+
+def test_notify_recent_messages_already_running(
+    cache: Redis,
+    email_connection: EmailSender,
+    full_storage: MessageStorage,
+    chat_subscriber: User,
+):
+    with cache.lock("notify_recent_messages_lock"):
+        tasks.notify_recent_messages()
+    email_connection.send_message.assert_not_called()
+    assert len(full_storage) == full_storage.storage_size_limit
+
+
+def test_notify_recent_messages_lock_expired(
+    cache: Redis,
+    email_connection: EmailSender,
+    full_storage: MessageStorage,
+    chat_subscriber: User,
+):
+    email_connection.send_message.side_effect = lambda *args, **kwargs: cache.delete(
+        "notify_recent_messages_lock"
+    )
+    tasks.notify_recent_messages()
+    assert len(full_storage) == 0
+
+
+def test_notify_recent_messages_failed(
+    cache: Redis,
+    container: Container,
+    full_storage: MessageStorage,
+):
+    email_service = container.email_service()
+    with patch.object(
+        email_service, "notify_recent_messages", side_effect=RuntimeError
+    ):
+        with pytest.raises(RuntimeError):
+            tasks.notify_recent_messages()
+    assert not cache.exists("notify_recent_messages_lock")
+
+
+def test_notify_recent_messages_reschedules_full_storage(
+    container: Container,
+    full_storage: MessageStorage,
+):
+    email_service = container.email_service()
+    with patch.object(email_service, "notify_recent_messages"), patch.object(
+        tasks.notify_recent_messages, "delay"
+    ) as delay_mock:
+        tasks.notify_recent_messages()
+    delay_mock.assert_called_once_with()
+
+
+def test_schedule_recent_messages_notification(storage: MessageStorage):
+    storage.add_storage_exhausted_listener(tasks.schedule_recent_messages_notification)
+    with patch.object(tasks.notify_recent_messages, "delay") as delay_mock:
+        for _ in range(storage.storage_size_limit + 1):
+            storage.push(MessageFactory())
+    delay_mock.assert_called_once_with()
+
+
+@pytest.fixture
+def prediction_subscribers(db: Database):
+    users = [UserFactory(subscribed_to_predictions=True) for _ in range(5)]
+    db.users.insert_many(user.dict() for user in users)
+    db.users.insert_one(UserFactory().dict())
+    return users
+
+
+def test_send_week_predictions(prediction_subscribers: list[User]):
+    with patch.object(tasks, "chord") as chord_mock:
+        tasks.send_week_predictions(chunk_size=2)
+    run_id = f"week:{datetime.now(timezone.utc).date().isoformat()}"
+    header = chord_mock.call_args.args[0]
+    assert [signature.args for signature in header] == [
+        ([user.account_id for user in prediction_subscribers[:2]], "week", run_id),
+        ([user.account_id for user in prediction_subscribers[2:4]], "week", run_id),
+        ([prediction_subscribers[4].account_id], "week", run_id),
+    ]
+    callback = chord_mock.return_value.call_args.args[0]
+    assert callback.task == tasks.report_predictions.name
+    assert callback.args == ("week", run_id)
+
+
+def test_send_week_predictions_scheduled_date(prediction_subscribers: list[User]):
+    with patch.object(tasks, "chord") as chord_mock:
+        tasks.send_week_predictions("2024-01-07")
+    callback = chord_mock.return_value.call_args.args[0]
+    assert callback.args == ("week", "week:2024-01-07")
+
+
+def test_send_month_predictions_no_subscribers():
+    with patch.object(tasks, "chord") as chord_mock:
+        tasks.send_month_predictions()
+    chord_mock.assert_not_called()
+
+
+def test_send_predictions_chunk(container: Container):
+    email_service = container.email_service()
+    report = {"sent": 1, "failed": 0, "skipped": 1}
+    with patch.object(
+        email_service, "send_predictions", return_value=report
+    ) as send_mock:
+        assert tasks.send_predictions_chunk([1, 2], "month", "run") == report
+    send_mock.assert_called_once_with(PredictionPeriod.MONTH, [1, 2], "run")
+
+
+def test_report_predictions(caplog: pytest.LogCaptureFixture):
+    caplog.set_level(logging.INFO)
+    tasks.report_predictions(
+        [
+            {"sent": 2, "failed": 0, "skipped": 0},
+            {"sent": 1, "failed": 1, "skipped": 2},
+        ],
+        "week",
+        "run",
+    )
+    assert (
+        "Predictions run run sent 3 week predictions in 2 chunks, "
+        "1 failed, 2 skipped"
+    ) in caplog.text
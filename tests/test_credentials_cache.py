@@ -0,0 +1,61 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.containers import Container
+from app.models import User
+from app.services.credentials_cache import CredentialsCache
+
+
+@pytest.fixture
+def credentials_cache(container: Container):
+    return container.credentials_cache()
+
+
+def test_get_missing(credentials_cache: CredentialsCache):
+    assert credentials_cache.get(1) is None
+    assert credentials_cache.get_stats() == {"hits": 0, "misses": 1}
+
+
+def test_set_and_get(credentials_cache: CredentialsCache, user: User):
+    credentials_cache.set(user.credentials)
+    assert credentials_cache.get(user.account_id) == user.credentials
+    assert credentials_cache.get_stats() == {"hits": 1, "misses": 0}
+
+
+def test_get_many(credentials_cache: CredentialsCache, user: User):
+    credentials_cache.set(user.credentials)
+    entries = credentials_cache.get_many([user.account_id, user.account_id + 1])
+    assert entries == {user.account_id: user.credentials, user.account_id + 1: None}
+    assert credentials_cache.get_stats() == {"hits": 1, "misses": 1}
+
+
+def test_get_many_empty(credentials_cache: CredentialsCache):
+    assert credentials_cache.get_many([]) == {}
+
+
+def test_invalidate(credentials_cache: CredentialsCache, user: User):
+    credentials_cache.set(user.credentials)
+    credentials_cache.invalidate(user.account_id)
+    assert credentials_cache.get(user.account_id) is None
+
+
+def test_set_after_invalidate(credentials_cache: CredentialsCache, user: User):
+    credentials_cache.invalidate(user.account_id)
+    credentials_cache.set(user.credentials)
+    assert credentials_cache.get(user.account_id) is None
+
+
+def test_stats_flushed_periodically(
+    container: Container,
+    credentials_cache: CredentialsCache,
+):
+    credentials_cache.get(1)
+    assert not container.cache().exists("user_credentials_stats")
+    with patch("time.monotonic", return_value=time.monotonic() + 60):
+        credentials_cache.get(1)
+    assert container.cache().hgetall("user_credentials_stats") == {
+        b"hits": b"0",
+        b"misses": b"2",
+    }
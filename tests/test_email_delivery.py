@@ -0,0 +1,65 @@
+from smtplib import SMTPServerDisconnected
+from unittest.mock import MagicMock
+
+import pytest
+from redmail import EmailSender
+
+from app.services.delivery import DeliveryReport, EmailSenderPool, PooledEmailSender
+
+
+@pytest.fixture
+def connection():
+    connection_mock = MagicMock(spec=EmailSender)
+    connection_mock.is_alive = True
+    return connection_mock
+
+
+@pytest.fixture
+def pool(connection: EmailSender):
+    return EmailSenderPool(
+        lambda: connection,
+        max_connections=2,
+        max_messages_per_connection=3,
+    )
+
+
+def _send_job(sender: PooledEmailSender) -> None:
+    sender.send(subject="Subject", receivers=["test@example.com"], text="Text")
+
+
+def test_run(connection: EmailSender, pool: EmailSenderPool):
+    job_count = 10
+    report = pool.run(_send_job for _ in range(job_count))
+    assert connection.send_message.call_count == job_count
+    assert report == DeliveryReport(succeeded=job_count)
+
+
+def test_run_job_failure(connection: EmailSender, pool: EmailSenderPool):
+    failing_job = MagicMock(side_effect=ValueError)
+    report = pool.run([_send_job, failing_job, _send_job])
+    assert connection.send_message.call_count == 2
+    assert report == DeliveryReport(succeeded=2, failed=1)
+
+
+def test_reconnect_on_disconnect(connection: EmailSender):
+    connection.send_message.side_effect = [SMTPServerDisconnected, None]
+    sender = PooledEmailSender(connection, max_messages=10)
+    _send_job(sender)
+    assert connection.send_message.call_count == 2
+    connection.connect.assert_called_once()
+
+
+def test_reconnect_after_max_messages(connection: EmailSender):
+    sender = PooledEmailSender(connection, max_messages=2)
+    for _ in range(5):
+        _send_job(sender)
+    assert connection.connect.call_count == 2
+    assert connection.close.call_count == 2
+
+
+def test_connect_lazily(connection: EmailSender):
+    connection.is_alive = False
+    sender = PooledEmailSender(connection, max_messages=2)
+    _send_job(sender)
+    connection.connect.assert_called_once()
+    connection.close.assert_not_called()
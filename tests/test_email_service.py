@@ -1,11 +1,13 @@
 from datetime import timedelta
+from smtplib import SMTPRecipientsRefused
+from unittest.mock import patch
 
 import pytest
 from mongomock import Database
 from redmail import EmailSender
 
 from app.containers import Container
-from app.models import User
+from app.models import Message, User
 from app.services.email import EmailService
 from app.services.messages import MessageStorage
 from app.services.predictions import PredictionPeriod
@@ -14,7 +16,7 @@ from app.services.transactions import TransactionsService
 from .factories import MessageFactory, TransactionFactory, UserFactory
 
 
-def _create_transactions(db: Database, account_id: int):
+def _create_transactions(service: TransactionsService, account_id: int):
     transactions = [TransactionFactory(account_id=account_id)]
     for _ in range(20):
         transaction = TransactionFactory(
@@ -22,23 +24,19 @@ def _create_transactions(db: Database, account_id: int):
             transaction_time=transactions[-1].transaction_time - timedelta(days=5),
         )
         transactions.append(transaction)
-    db.transactions.insert_many(
-        (
-            TransactionsService.serialize_transaction(transaction)
-            for transaction in transactions
-        )
-    )
+    service.add_transactions(transactions)
 
 
 @pytest.fixture
-def subscribed_users(db: Database):
+def subscribed_users(db: Database, container: Container):
+    transactions_service = container.transactions_service()
     recipients = []
     for _ in range(5):
         user = UserFactory(
             subscribed_to_chat=True,
             subscribed_to_predictions=True,
         )
-        _create_transactions(db, user.account_id)
+        _create_transactions(transactions_service, user.account_id)
         db.users.insert_one(user.dict())
         recipients.append(user)
     return recipients
@@ -56,13 +54,80 @@ def email_connection(container: Container):
 
 def test_notify_recent_messages(
     email_connection: EmailSender,
+    email_service: EmailService,
     storage: MessageStorage,
     subscribed_users: list[User],
 ):
     for _ in range(storage.storage_size_limit):
         message = MessageFactory()
         storage.push(message)
-    assert email_connection.send.call_count == len(subscribed_users)
+    email_service.notify_recent_messages(storage)
+    assert email_connection.send_message.call_count == len(subscribed_users)
+    assert len(storage) == 0
+
+
+def test_notify_recent_messages_renders_once(
+    email_connection: EmailSender,
+    email_service: EmailService,
+    storage: MessageStorage,
+    subscribed_users: list[User],
+    saved_message: Message,
+):
+    email_service.notify_recent_messages(storage)
+    rendered_bodies = {
+        call.kwargs["html"] for call in email_connection.get_message.call_args_list
+    }
+    assert len(rendered_bodies) == 1
+    assert saved_message.text in rendered_bodies.pop()
+
+
+def test_notify_recent_messages_keeps_new_messages(
+    email_connection: EmailSender,
+    email_service: EmailService,
+    storage: MessageStorage,
+    subscribed_users: list[User],
+):
+    storage.push(MessageFactory())
+    new_message = MessageFactory()
+    email_connection.send_message.side_effect = lambda _: storage.push(new_message)
+    email_service.notify_recent_messages(storage)
+    assert len(storage) == 1
+    assert new_message in storage
+
+
+def test_notify_recent_messages_batched(
+    email_connection: EmailSender,
+    email_service: EmailService,
+    storage: MessageStorage,
+    subscribed_users: list[User],
+    saved_message: Message,
+):
+    email_service.digest_batch_size = 2
+    email_service.notify_recent_messages(storage)
+    assert email_connection.send_message.call_count == 3
+    recipients = [
+        email
+        for call in email_connection.get_message.call_args_list
+        for email in call.kwargs["bcc"]
+    ]
+    assert sorted(recipients) == sorted(user.email for user in subscribed_users)
+
+
+def test_notify_recent_messages_batch_rejected(
+    email_connection: EmailSender,
+    email_service: EmailService,
+    storage: MessageStorage,
+    subscribed_users: list[User],
+    saved_message: Message,
+):
+    email_service.digest_batch_size = len(subscribed_users)
+    individual_responses = [None] * len(subscribed_users)
+    email_connection.send_message.side_effect = [
+        SMTPRecipientsRefused({}),
+        *individual_responses,
+    ]
+    email_service.notify_recent_messages(storage)
+    assert email_connection.send_message.call_count == len(subscribed_users) + 1
     assert len(storage) == 0
 
 
@@ -72,7 +137,7 @@ def test_notify_no_recent_messages(
     storage: MessageStorage,
 ):
     email_service.notify_recent_messages(storage)
-    email_connection.send.assert_not_called()
+    email_connection.send_message.assert_not_called()
 
 
 def test_send_predictions_empty(
@@ -80,7 +145,7 @@ def test_send_predictions_empty(
     email_service: EmailService,
 ):
     email_service.send_predictions(PredictionPeriod.MONTH)
-    email_connection.send.assert_not_called()
+    email_connection.send_message.assert_not_called()
 
 
 def test_send_predictions(
@@ -88,5 +153,84 @@ def test_send_predictions(
     email_service: EmailService,
     subscribed_users: list[User],
 ):
-    email_service.send_predictions(PredictionPeriod.WEEK)
-    assert email_connection.send.call_count == len(subscribed_users)
+    report = email_service.send_predictions(PredictionPeriod.WEEK)
+    assert email_connection.send_message.call_count == len(subscribed_users)
+    assert report == {"sent": len(subscribed_users), "failed": 0, "skipped": 0}
+
+
+def test_send_predictions_resumed_run(
+    email_connection: EmailSender,
+    email_service: EmailService,
+    subscribed_users: list[User],
+):
+    email_service.prediction_runs.claim("run", subscribed_users[0].account_id)
+    report = email_service.send_predictions(PredictionPeriod.WEEK, run_id="run")
+    assert report == {"sent": len(subscribed_users) - 1, "failed": 0, "skipped": 1}
+    report = email_service.send_predictions(PredictionPeriod.WEEK, run_id="run")
+    assert report == {"sent": 0, "failed": 0, "skipped": len(subscribed_users)}
+    assert email_connection.send_message.call_count == len(subscribed_users) - 1
+
+
+def test_send_predictions_claimed_concurrently(
+    email_connection: EmailSender,
+    email_service: EmailService,
+    subscribed_users: list[User],
+):
+    prediction_runs = email_service.prediction_runs
+    with patch.object(
+        prediction_runs, "filter_unsent", side_effect=lambda _, ids: list(ids)
+    ):
+        prediction_runs.claim("run", subscribed_users[0].account_id)
+        report = email_service.send_predictions(PredictionPeriod.WEEK, run_id="run")
+    assert report == {"sent": len(subscribed_users) - 1, "failed": 0, "skipped": 1}
+    assert email_connection.send_message.call_count == len(subscribed_users) - 1
+
+
+def test_send_predictions_failure_releases_claim(
+    email_connection: EmailSender,
+    email_service: EmailService,
+    subscribed_users: list[User],
+):
+    email_connection.send_message.side_effect = [SMTPRecipientsRefused({})] + [
+        None
+    ] * len(subscribed_users)
+    report = email_service.send_predictions(PredictionPeriod.WEEK, run_id="run")
+    assert report == {"sent": len(subscribed_users) - 1, "failed": 1, "skipped": 0}
+    report = email_service.send_predictions(PredictionPeriod.WEEK, run_id="run")
+    assert report == {"sent": 1, "failed": 0, "skipped": len(subscribed_users) - 1}
+
+
+def test_send_predictions_to_accounts(
+    email_connection: EmailSender,
+    email_service: EmailService,
+    subscribed_users: list[User],
+):
+    account_ids = [user.account_id for user in subscribed_users[:2]]
+    report = email_service.send_predictions(PredictionPeriod.WEEK, account_ids)
+    assert email_connection.send_message.call_count == len(account_ids)
+    assert report == {"sent": len(account_ids), "failed": 0, "skipped": 0}
+
+
+def test_send_predictions_failures(
+    db: Database,
+    email_connection: EmailSender,
+    email_service: EmailService,
+    subscribed_users: list[User],
+):
+    db.users.insert_one(UserFactory(subscribed_to_predictions=True).dict())
+    email_connection.send_message.side_effect = [SMTPRecipientsRefused({})] + [
+        None
+    ] * len(subscribed_users)
+    report = email_service.send_predictions(PredictionPeriod.WEEK)
+    assert report == {"sent": len(subscribed_users) - 1, "failed": 1, "skipped": 1}
+
+
+def test_send_predictions_to_deleted_accounts(
+    email_connection: EmailSender,
+    email_service: EmailService,
+    subscribed_users: list[User],
+):
+    account_ids = [subscribed_users[0].account_id, -1]
+    report = email_service.send_predictions(PredictionPeriod.WEEK, account_ids)
+    assert email_connection.send_message.call_count == 1
+    assert report == {"sent": 1, "failed": 0, "skipped": 1}
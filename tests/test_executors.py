@@ -0,0 +1,60 @@
+import multiprocessing
+import os
+from concurrent.futures import wait
+
+import pytest
+from billiard.exceptions import WorkerLostError
+
+from app.services.executors import BilliardPoolExecutor
+
+
+def square(value: int) -> int:
+    return value * value
+
+
+def fail(message: str) -> None:
+    raise ValueError(message)
+
+
+def exit_worker() -> None:
+    os._exit(1)
+
+
+def test_submit():
+    with BilliardPoolExecutor(2) as executor:
+        futures = [executor.submit(square, value) for value in range(4)]
+        wait(futures)
+    assert [future.result() for future in futures] == [0, 1, 4, 9]
+
+
+def test_submit_failure():
+    with BilliardPoolExecutor(1) as executor:
+        future = executor.submit(fail, "invalid")
+        with pytest.raises(ValueError, match="invalid"):
+            future.result(timeout=60)
+
+
+def test_submit_worker_lost():
+    with BilliardPoolExecutor(1) as executor:
+        future = executor.submit(exit_worker)
+        with pytest.raises(WorkerLostError):
+            future.result(timeout=60)
+
+
+def test_submit_in_daemonic_process():
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+
+    def run() -> None:
+        try:
+            with BilliardPoolExecutor(2) as executor:
+                futures = [executor.submit(square, value) for value in range(4)]
+                results.put([future.result() for future in futures])
+        except Exception as exc:
+            results.put(exc)
+
+    process = context.Process(target=run, daemon=True)
+    process.start()
+    result = results.get(timeout=60)
+    process.join()
+    assert result == [0, 1, 4, 9]
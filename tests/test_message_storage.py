@@ -1,7 +1,13 @@
 from unittest.mock import MagicMock
 
+from redis import Redis
+
 from app.models import Message
-from app.services.messages import MessageStorage
+from app.services.messages import (
+    JsonMessageSerializer,
+    MessageStorage,
+    RedisMessageStorage,
+)
 
 from .factories import MessageFactory
 
@@ -22,11 +28,61 @@ def test_get_all(storage: MessageStorage):
         assert message.sender == sender
 
 
+def test_get_all_skips_missing_messages(storage: MessageStorage, cache: Redis):
+    storage.push(MessageFactory())
+    cache.zadd("messages_set", {"missing": 0})
+    assert len(storage.get_all()) == 1
+
+
+def test_get_all_hash_layout(storage: MessageStorage, cache: Redis):
+    legacy_message = MessageFactory()
+    _save_legacy_message(cache, legacy_message)
+    storage.push(MessageFactory())
+    saved_messages = storage.get_all()
+    assert len(saved_messages) == 2
+    assert legacy_message in saved_messages
+
+
+def test_migrate_hash_layout(storage: RedisMessageStorage, cache: Redis):
+    legacy_messages = [MessageFactory() for _ in range(3)]
+    for legacy_message in legacy_messages:
+        _save_legacy_message(cache, legacy_message)
+    storage.push(MessageFactory())
+    assert storage.migrate_hash_layout() == len(legacy_messages)
+    assert cache.get(f"message:{legacy_messages[0].id}")
+    assert storage.migrate_hash_layout() == 0
+    assert len(storage.get_all()) == len(legacy_messages) + 1
+
+
+def test_json_serializer(message: Message):
+    serializer = JsonMessageSerializer()
+    assert serializer.loads(serializer.dumps(message)) == message
+
+
 def test_remove(storage: MessageStorage, saved_message: Message):
     storage.remove(saved_message.id)
     assert saved_message.id not in storage
 
 
+def test_remove_many(storage: MessageStorage):
+    messages = [MessageFactory() for _ in range(5)]
+    for message in messages:
+        storage.push(message)
+    storage.remove_many(message.id for message in messages[:3])
+    assert len(storage) == 2
+    for message in messages[3:]:
+        assert message in storage
+
+
+def test_remove_many_chunked(storage: MessageStorage, cache: Redis):
+    message_count = 1200
+    for _ in range(message_count):
+        storage.push(MessageFactory())
+    storage.remove_many(message.id for message in storage.get_all())
+    assert len(storage) == 0
+    assert not cache.keys("message:*")
+
+
 def test_clear(storage: MessageStorage):
     message_count = 12
     for _ in range(message_count):
@@ -55,3 +111,21 @@ def test_storage_exhausted_listener(storage: MessageStorage):
     for _ in range(storage.storage_size_limit):
         storage.push(MessageFactory())
     listener_mock.assert_called_once_with(storage)
+
+
+def test_storage_exhausted_listener_called_once(storage: MessageStorage):
+    listener_mock = MagicMock()
+    storage.add_storage_exhausted_listener(listener_mock)
+    for _ in range(storage.storage_size_limit + 5):
+        storage.push(MessageFactory())
+    listener_mock.assert_called_once_with(storage)
+
+
+def test_push_existing_message(storage: MessageStorage, saved_message: Message):
+    storage.push(saved_message)
+    assert len(storage) == 1
+
+
+def _save_legacy_message(cache: Redis, message: Message) -> None:
+    cache.hset(f"message:{message.id}", mapping=message.dict_of_str())
+    cache.zadd("messages_set", {message.id: message.timestamp.timestamp()})
@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+import pytest
+
+from app.containers import Container
+from app.models import Prediction
+from app.services.prediction_cache import PredictionCache
+
+
+@pytest.fixture
+def prediction():
+    return Prediction(amount=Decimal("12.34"), model="arima")
+
+
+@pytest.fixture
+def prediction_cache(container: Container):
+    return container.prediction_cache()
+
+
+def test_get_missing(prediction_cache: PredictionCache):
+    assert prediction_cache.get(1, "week") == (0, None)
+
+
+def test_set_and_get(prediction_cache: PredictionCache, prediction: Prediction):
+    prediction_cache.set(1, "week", 0, prediction)
+    assert prediction_cache.get(1, "week") == (0, prediction)
+    assert prediction_cache.get(1, "month") == (0, None)
+
+
+def test_invalidate(prediction_cache: PredictionCache, prediction: Prediction):
+    prediction_cache.set(1, "week", 0, prediction)
+    prediction_cache.set(2, "week", 0, prediction)
+    prediction_cache.invalidate([1, 1])
+    entries = prediction_cache.get_many([1, 2], "week")
+    assert entries == {1: (1, None), 2: (0, prediction)}
+
+
+def test_set_outdated_version(
+    prediction_cache: PredictionCache,
+    prediction: Prediction,
+):
+    version, _ = prediction_cache.get(1, "week")
+    prediction_cache.invalidate([1])
+    prediction_cache.set(1, "week", version, prediction)
+    assert prediction_cache.get(1, "week") == (1, None)
+
+
+def test_ttl(prediction_cache: PredictionCache, prediction: Prediction, cache):
+    prediction_cache.set(1, "week", 0, prediction)
+    assert 0 < cache.ttl("prediction:1:week") <= prediction_cache.ttl
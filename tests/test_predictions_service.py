@@ -1,13 +1,29 @@
+import multiprocessing
+from dataclasses import replace
 from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import MagicMock
 
+import numpy as np
+import pandas as pd
 import pytest
-from mongomock import Database
 
 from app.containers import Container
-from app.models import Transaction
+from app.models import Prediction, Transaction
+from app.services import predictions
 from app.services.exceptions import NotFound
-from app.services.predictions import PredictionPeriod, PredictionsService
-from app.services.transactions import TransactionsService
+from app.services.predictions import (
+    ModelSettings,
+    PredictionPeriod,
+    PredictionsService,
+    make_prediction,
+    make_predictions,
+    month_bins,
+    resample,
+    resample_many,
+    week_bins,
+)
+from app.services.transactions import AccountDailyTotalArrays, DailyTotalArrays
 
 from .factories import TransactionFactory
 
@@ -18,7 +34,7 @@ def service(container: Container):
 
 
 @pytest.fixture
-def dataset(db: Database, transaction: Transaction):
+def dataset(container: Container, transaction: Transaction):
     transaction_records = []
     for _ in range(40):
         transaction = TransactionFactory(
@@ -26,12 +42,7 @@ def dataset(db: Database, transaction: Transaction):
             transaction_time=transaction.transaction_time - timedelta(days=3),
         )
         transaction_records.append(transaction)
-    db.transactions.insert_many(
-        (
-            TransactionsService.serialize_transaction(transaction)
-            for transaction in transaction_records
-        )
-    )
+    container.transactions_service().add_transactions(transaction_records)
     return transaction_records
 
 
@@ -45,7 +56,7 @@ def test_predict_week(
     dataset: list[Transaction],
 ):
     prediction = service.predict_week(dataset[0].account_id)
-    assert prediction > 0
+    assert prediction.amount > 0
 
 
 def test_predict_month_empty(service: PredictionsService):
@@ -58,7 +69,7 @@ def test_predict_month(
     dataset: list[Transaction],
 ):
     prediction = service.predict_month(dataset[0].account_id)
-    assert prediction > 0
+    assert prediction.amount > 0
 
 
 def test_predict_period(
@@ -67,4 +78,186 @@ def test_predict_period(
 ):
     for period in PredictionPeriod:
         prediction = service.predict_period(dataset[0].account_id, period)
-        assert prediction > 0
+        assert prediction.amount > 0
+
+
+def test_predict_many(
+    service: PredictionsService,
+    dataset: list[Transaction],
+):
+    account_id = dataset[0].account_id
+    missing_account_id = account_id + 1
+    predictions = dict(
+        service.predict_many([account_id, missing_account_id], PredictionPeriod.WEEK)
+    )
+    assert predictions[account_id].amount > 0
+    assert isinstance(predictions[missing_account_id], NotFound)
+
+
+def test_predict_many_in_daemonic_process(
+    service: PredictionsService,
+    dataset: list[Transaction],
+):
+    account_id = dataset[0].account_id
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+
+    def predict() -> None:
+        try:
+            results.put(dict(service.predict_many([account_id], PredictionPeriod.WEEK)))
+        except Exception as exc:
+            results.put(exc)
+
+    process = context.Process(target=predict, daemon=True)
+    process.start()
+    predictions = results.get(timeout=60)
+    process.join()
+    assert not isinstance(predictions, Exception)
+    assert predictions[account_id].amount > 0
+
+
+def test_predict_period_cached(
+    monkeypatch: pytest.MonkeyPatch,
+    service: PredictionsService,
+    dataset: list[Transaction],
+):
+    account_id = dataset[0].account_id
+    prediction = service.predict_week(account_id)
+    make_prediction = MagicMock()
+    monkeypatch.setattr(predictions, "make_prediction", make_prediction)
+    assert service.predict_week(account_id) == prediction
+    make_prediction.assert_not_called()
+
+
+def test_predict_period_invalidated(
+    monkeypatch: pytest.MonkeyPatch,
+    service: PredictionsService,
+    dataset: list[Transaction],
+):
+    account_id = dataset[0].account_id
+    service.predict_week(account_id)
+    service.prediction_cache.invalidate([account_id])
+    prediction = Prediction(amount=Decimal("1.23"), model="constant")
+    make_prediction = MagicMock(return_value=(prediction, None))
+    monkeypatch.setattr(predictions, "make_prediction", make_prediction)
+    assert service.predict_week(account_id) == prediction
+    make_prediction.assert_called_once()
+
+
+def test_predict_many_cached(
+    service: PredictionsService,
+    dataset: list[Transaction],
+):
+    account_id = dataset[0].account_id
+    prediction = Prediction(amount=Decimal(5), model="constant")
+    service.prediction_cache.set(account_id, PredictionPeriod.WEEK, 0, prediction)
+    predictions = dict(service.predict_many([account_id], PredictionPeriod.WEEK))
+    assert predictions == {account_id: prediction}
+
+
+def _make_dataset(amounts: list[float]) -> np.ndarray:
+    return np.array(amounts, dtype=float)
+
+
+def test_make_prediction_constant():
+    prediction, _ = make_prediction(_make_dataset([10] * 30), ModelSettings())
+    assert prediction == Prediction(amount=Decimal(10), model="constant")
+
+
+def test_make_prediction_short_series():
+    dataset = _make_dataset([1, 2, 3, 4, 5, 6])
+    prediction, _ = make_prediction(dataset, ModelSettings())
+    assert prediction == Prediction(amount=Decimal("4.5"), model="moving_average")
+
+
+def test_make_prediction_sparse_series():
+    dataset = _make_dataset([0, 0, 0, 10] * 8)
+    prediction, _ = make_prediction(dataset, ModelSettings())
+    assert prediction.model == "exponential_smoothing"
+    assert prediction.amount > 0
+
+
+def test_make_prediction_arima():
+    dataset = _make_dataset([10 + (index % 5) for index in range(30)])
+    prediction, _ = make_prediction(
+        dataset,
+        ModelSettings(arima_max_order=1, arima_maxiter=10),
+    )
+    assert prediction.model == "arima"
+    assert prediction.amount > 0
+
+
+def test_make_prediction_arima_warm_start():
+    dataset = _make_dataset([10 + (index % 5) for index in range(30)])
+    settings = ModelSettings(arima_max_order=1, arima_maxiter=10)
+    _, arima_state = make_prediction(dataset, settings)
+    assert arima_state.fits_since_search == 0
+    prediction, warm_state = make_prediction(dataset, settings, arima_state)
+    assert prediction.model == "arima"
+    assert warm_state.order == arima_state.order
+    assert warm_state.fits_since_search == 1
+
+
+def test_make_prediction_arima_periodic_search():
+    dataset = _make_dataset([10 + (index % 5) for index in range(30)])
+    settings = ModelSettings(
+        arima_max_order=1,
+        arima_maxiter=10,
+        arima_search_interval=1,
+    )
+    _, arima_state = make_prediction(dataset, settings)
+    arima_state = replace(arima_state, fits_since_search=1)
+    _, arima_state = make_prediction(dataset, settings, arima_state)
+    assert arima_state.fits_since_search == 0
+
+
+def test_predict_period_saves_arima_state(
+    service: PredictionsService,
+    dataset: list[Transaction],
+):
+    account_id = dataset[0].account_id
+    service.predict_week(account_id)
+    arima_states = service.arima_states.get_many([account_id], PredictionPeriod.WEEK)
+    assert arima_states[account_id].fits_since_search == 0
+
+
+@pytest.mark.parametrize("bins, rule", [(week_bins, "W-MON"), (month_bins, "M")])
+def test_resample(bins, rule: str):
+    dates = np.arange("2022-01-03", "2023-03-17", 3, dtype="datetime64[D]")
+    total_cents = np.arange(len(dates), dtype=np.int64) * 125
+    expected = pd.Series(total_cents / 100, index=pd.DatetimeIndex(dates))
+    time_series = resample(DailyTotalArrays(dates, total_cents), bins)
+    np.testing.assert_allclose(time_series, expected.resample(rule).sum())
+
+
+@pytest.mark.parametrize("bins", [week_bins, month_bins])
+def test_resample_many(bins):
+    series = {
+        1: np.arange("2022-01-03", "2023-03-17", 3, dtype="datetime64[D]"),
+        2: np.array(["2022-05-10"], dtype="datetime64[D]"),
+        3: np.arange("2021-11-20", "2022-02-01", 5, dtype="datetime64[D]"),
+    }
+    daily_totals = {
+        account_id: DailyTotalArrays(dates, np.full(len(dates), 150, np.int64))
+        for account_id, dates in series.items()
+    }
+    grouped_totals = AccountDailyTotalArrays(
+        np.concatenate(
+            [np.full(len(dates), account_id) for account_id, dates in series.items()]
+        ),
+        np.concatenate(list(series.values())),
+        np.concatenate([totals.total_cents for totals in daily_totals.values()]),
+    )
+    result = dict(resample_many(grouped_totals, bins))
+    assert list(result) == list(series)
+    for account_id, totals in daily_totals.items():
+        np.testing.assert_allclose(result[account_id], resample(totals, bins))
+
+
+def test_make_predictions_isolates_errors():
+    results = make_predictions(
+        [(_make_dataset([10] * 30), None), (np.zeros((2, 2)), None)],
+        ModelSettings(),
+    )
+    assert results[0][0].model == "constant"
+    assert isinstance(results[1], Exception)
@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+from app.services.token_cache import VerifiedToken, VerifiedTokenCache
+
+
+@pytest.fixture
+def token_cache():
+    return VerifiedTokenCache(max_size=2, ttl=60)
+
+
+def test_get_missing(token_cache: VerifiedTokenCache):
+    assert token_cache.get("token") is None
+
+
+def test_set_and_get(token_cache: VerifiedTokenCache):
+    token_cache.set("token", 1, "signing_key")
+    verified_token = token_cache.get(b"token")
+    assert verified_token
+    assert verified_token[:2] == (1, "signing_key")
+
+
+def test_get_expired(token_cache: VerifiedTokenCache):
+    token_cache.set("token", 1, "signing_key", expires_at=time.time() - 1)
+    assert token_cache.get("token") is None
+
+
+def test_set_limits_expiration_by_ttl(token_cache: VerifiedTokenCache):
+    token_cache.set("token", 1, "signing_key", expires_at=time.time() + 3600)
+    verified_token = token_cache.get("token")
+    assert isinstance(verified_token, VerifiedToken)
+    assert verified_token.expires_at <= time.time() + token_cache.ttl
+
+
+def test_set_evicts_least_recently_used(token_cache: VerifiedTokenCache):
+    token_cache.set("first", 1, "signing_key")
+    token_cache.set("second", 2, "signing_key")
+    token_cache.get("first")
+    token_cache.set("third", 3, "signing_key")
+    assert token_cache.get("second") is None
+    assert token_cache.get("first")
+    assert token_cache.get("third")
+
+
+def test_discard(token_cache: VerifiedTokenCache):
+    token_cache.set("token", 1, "signing_key")
+    token_cache.discard("token")
+    assert token_cache.get("token") is None
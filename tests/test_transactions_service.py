@@ -1,16 +1,19 @@
-from datetime import timedelta
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 from operator import attrgetter
+from unittest.mock import patch
 
 import pytest
 from mongomock import Database
+from pymongo.database import Database as PymongoDatabase
 
 from app.containers import Container
 from app.models import Transaction
 from app.services.exceptions import NotFound
-from app.services.transactions import TransactionsService
+from app.services.transactions import TransactionFilters, TransactionsService
 
 from .factories import TransactionFactory
+from .query_plans import winning_plan_stages
 
 
 @pytest.fixture
@@ -65,22 +68,314 @@ def test_filter_transactions_time_range(
     assert result[0].account_id == saved_transaction.account_id
 
 
-def test_compute_daily_total(db: Database, service: TransactionsService):
+def test_compute_daily_total(service: TransactionsService):
     account_id = 123
     expected_total = Decimal(100)
     transaction_quantity = 10
-    for _ in range(transaction_quantity):
-        transaction = TransactionFactory(
+    transactions = [
+        TransactionFactory(
             account_id=account_id,
             amount=expected_total / transaction_quantity,
         )
-        serialized_transaction = TransactionsService.serialize_transaction(transaction)
-        db.transactions.insert_one(serialized_transaction)
+        for _ in range(transaction_quantity)
+    ]
+    service.add_transactions(transactions)
     result = service.compute_daily_total({"account_id": account_id})
     today_total = next(result)
     assert today_total["total_amount"] == expected_total
 
 
+@pytest.mark.parametrize(
+    "start_time, end_time, expected_totals",
+    [
+        (None, datetime(2023, 1, 2, 12), [(date(2023, 1, 1), Decimal("3.00"))]),
+        (datetime(2023, 1, 1, 12), None, [(date(2023, 1, 2), Decimal("5.00"))]),
+        (
+            datetime(2023, 1, 1, 6),
+            datetime(2023, 1, 1, 12),
+            [(date(2023, 1, 1), Decimal("1.00"))],
+        ),
+        (
+            datetime(2023, 1, 1, 6),
+            datetime(2023, 1, 2, 20),
+            [(date(2023, 1, 1), Decimal("1.00")), (date(2023, 1, 2), Decimal("5.00"))],
+        ),
+        (
+            datetime(2023, 1, 1),
+            datetime(2023, 1, 3),
+            [(date(2023, 1, 1), Decimal("3.00")), (date(2023, 1, 2), Decimal("5.00"))],
+        ),
+    ],
+)
+def test_compute_daily_total_partial_days(
+    service: TransactionsService,
+    start_time: datetime | None,
+    end_time: datetime | None,
+    expected_totals: list[tuple[date, Decimal]],
+):
+    service.add_transactions(
+        [
+            TransactionFactory(
+                account_id=123,
+                amount=amount,
+                transaction_type="OUT",
+                transaction_time=transaction_time,
+            )
+            for transaction_time, amount in [
+                (datetime(2023, 1, 1, 3), Decimal("2.00")),
+                (datetime(2023, 1, 1, 9), Decimal("1.00")),
+                (datetime(2023, 1, 2, 18), Decimal("5.00")),
+            ]
+        ]
+    )
+    filters: TransactionFilters = {"account_id": 123, "transaction_type": "OUT"}
+    if start_time:
+        filters["start_time"] = start_time
+    if end_time:
+        filters["end_time"] = end_time
+    result = service.compute_daily_total(filters)
+    assert [(total["date"], total["total_amount"]) for total in result] == (
+        expected_totals
+    )
+    arrays = service.compute_daily_total_arrays(filters)
+    assert arrays.dates.tolist() == [day for day, _ in expected_totals]
+
+
+def test_compute_daily_total_arrays(service: TransactionsService):
+    transactions = [
+        TransactionFactory(
+            account_id=123,
+            amount=Decimal("1.25"),
+            transaction_time=datetime(2023, 1, 1) + timedelta(days=days // 2),
+        )
+        for days in range(6)
+    ]
+    service.add_transactions(transactions)
+    result = service.compute_daily_total_arrays({"account_id": 123})
+    assert result.dates.tolist() == [date(2023, 1, day) for day in range(1, 4)]
+    assert result.total_cents.tolist() == [250, 250, 250]
+
+
+def test_compute_daily_total_arrays_by_account(service: TransactionsService):
+    for account_id in (1, 2):
+        service.add_transactions([TransactionFactory(account_id=account_id)])
+    result = service.compute_daily_total_arrays_by_account([1, 2, 3], {})
+    assert result.account_ids.tolist() == [1, 2]
+    assert len(result.dates) == len(result.total_cents) == 2
+
+
+def test_compute_daily_total_arrays_by_account_partial_day(
+    service: TransactionsService,
+):
+    service.add_transactions(
+        [
+            TransactionFactory(
+                account_id=account_id,
+                amount=Decimal("1.00"),
+                transaction_time=datetime(2023, 1, day, hour),
+            )
+            for account_id in (1, 2)
+            for day, hour in [(1, 6), (1, 18), (2, 6)]
+        ]
+    )
+    result = service.compute_daily_total_arrays_by_account(
+        [1, 2], {"start_time": datetime(2023, 1, 1, 12)}
+    )
+    assert result.account_ids.tolist() == [1, 1, 2, 2]
+    assert result.dates.tolist() == [date(2023, 1, 1), date(2023, 1, 2)] * 2
+    assert result.total_cents.tolist() == [100] * 4
+
+
+def test_indexes(db: Database, service: TransactionsService):
+    index_names = db.transactions.index_information()
+    assert "account_id_1_transaction_type_1_transaction_time_1" in index_names
+
+
+def test_indexes_drop_obsolete(db: Database, service: TransactionsService):
+    db.transactions.create_index("account_id")
+    service.ensure_indexes()
+    assert "account_id_1" not in db.transactions.index_information()
+
+
+def test_indexes_keep_unmanaged(db: Database, service: TransactionsService):
+    db.transactions.create_index("transaction_time")
+    service.ensure_indexes()
+    assert "transaction_time_1" in db.transactions.index_information()
+
+
+def test_filter_transactions_uses_index(mongo_db: PymongoDatabase):
+    service = TransactionsService(mongo_db)
+    service.ensure_indexes()
+    service.add_transactions([TransactionFactory() for _ in range(10)])
+    explain = service.collection.find(
+        {
+            "account_id": 1,
+            "transaction_type": "OUT",
+            "transaction_time": {"$gte": datetime.utcnow() - timedelta(days=30)},
+        }
+    ).explain()
+    stages = winning_plan_stages(explain)
+    assert "IXSCAN" in stages
+    assert "COLLSCAN" not in stages
+
+
+def test_daily_total_pipeline_uses_index(mongo_db: PymongoDatabase):
+    service = TransactionsService(mongo_db)
+    service.ensure_indexes()
+    service.add_transactions([TransactionFactory() for _ in range(10)])
+    explain = service.explain_daily_totals(
+        {
+            "account_id": 1,
+            "transaction_type": "OUT",
+            "start_time": datetime.utcnow() - timedelta(days=30),
+        }
+    )
+    stages = winning_plan_stages(explain)
+    assert "IXSCAN" in stages
+    assert "COLLSCAN" not in stages
+
+
+def test_daily_totals_by_account_pipeline_uses_index(mongo_db: PymongoDatabase):
+    service = TransactionsService(mongo_db)
+    service.ensure_indexes()
+    service.add_transactions(
+        [TransactionFactory(account_id=account_id) for account_id in range(10)]
+    )
+    explain = service.explain_daily_totals(
+        {
+            "transaction_type": "OUT",
+            "start_time": datetime.utcnow() - timedelta(days=30),
+        },
+        [1, 2, 3],
+    )
+    stages = winning_plan_stages(explain)
+    assert "IXSCAN" in stages
+    assert "COLLSCAN" not in stages
+
+
+def test_explain_daily_totals(db: Database, service: TransactionsService):
+    with patch.object(db, "command") as command_mock:
+        service.explain_daily_totals(
+            {"account_id": 1, "start_time": datetime(2023, 1, 1, 12)}
+        )
+    pipeline = command_mock.call_args.kwargs["pipeline"]
+    assert pipeline[0]["$match"] == {
+        "account_id": 1,
+        "date": {"$gte": datetime(2023, 1, 2)},
+        "transaction_count": {"$gt": 0},
+    }
+    assert command_mock.call_args.kwargs["explain"]
+
+
+def test_daily_totals_follow_changes(service: TransactionsService):
+    account_id = 123
+    transactions = [
+        TransactionFactory(account_id=account_id, amount=Decimal("10.25"))
+        for _ in range(3)
+    ]
+    service.add_transactions(transactions)
+    updated_transaction = transactions[0].copy()
+    updated_transaction.amount = Decimal("0.75")
+    service.add_transactions([updated_transaction])
+    service.delete_transactions([transactions[1].transaction_id])
+    result = list(service.compute_daily_total({"account_id": account_id}))
+    assert [total["total_amount"] for total in result] == [Decimal("11.00")]
+    assert list(service.check_daily_totals()) == []
+
+
+def test_daily_totals_skip_emptied_days(service: TransactionsService):
+    transaction = TransactionFactory(account_id=123)
+    service.add_transactions([transaction])
+    service.delete_transactions([transaction.transaction_id])
+    assert list(service.compute_daily_total({"account_id": 123})) == []
+
+
+def test_check_daily_totals(db: Database, service: TransactionsService):
+    transaction = TransactionFactory(account_id=123, amount=Decimal("5.50"))
+    service.add_transactions([transaction])
+    db.daily_totals.update_many({}, {"$inc": {"total_cents": 100}})
+    mismatches = list(service.check_daily_totals([123]))
+    assert len(mismatches) == 1
+    assert mismatches[0]["expected_total"] == Decimal("5.50")
+    assert mismatches[0]["stored_total"] == Decimal("6.50")
+
+
+def test_rebuild_daily_totals(db: Database, service: TransactionsService):
+    transactions = [TransactionFactory(account_id=123) for _ in range(3)]
+    db.transactions.insert_many(
+        TransactionsService.serialize_transaction(transaction)
+        for transaction in transactions
+    )
+    db.daily_totals.insert_one(
+        {
+            "account_id": 123,
+            "transaction_type": "IN",
+            "date": datetime(2020, 1, 1),
+            "total_cents": 100,
+            "transaction_count": 1,
+        }
+    )
+    assert len(list(service.check_daily_totals())) == 2
+    assert service.rebuild_daily_totals() == {123}
+    assert list(service.check_daily_totals()) == []
+    assert service.rebuild_daily_totals() == set()
+    result = list(service.compute_daily_total({"account_id": 123}))
+    expected_total = sum(transaction.amount for transaction in transactions)
+    assert [total["total_amount"] for total in result] == [expected_total]
+
+
+def test_backfill_daily_totals(db: Database, service: TransactionsService):
+    transactions = [TransactionFactory(account_id=account_id) for account_id in (1, 2)]
+    service.add_transactions(transactions[:1])
+    db.daily_totals.update_many({}, {"$unset": {"entries": ""}})
+    db.transactions.insert_one(
+        TransactionsService.serialize_transaction(transactions[1])
+    )
+    assert service.backfill_daily_totals() == {1, 2}
+    assert list(service.check_daily_totals()) == []
+    assert service.backfill_daily_totals() == set()
+
+
+def test_add_transactions_redelivered(service: TransactionsService):
+    transaction = TransactionFactory(account_id=123, amount=Decimal("5.50"))
+    with patch.object(service.collection, "bulk_write", side_effect=RuntimeError):
+        with pytest.raises(RuntimeError):
+            service.add_transactions([transaction])
+    service.add_transactions([transaction])
+    service.add_transactions([transaction])
+    result = list(service.compute_daily_total({"account_id": 123}))
+    assert [total["total_amount"] for total in result] == [Decimal("5.50")]
+    assert list(service.check_daily_totals()) == []
+
+
+def test_add_transactions_moved_and_redelivered(service: TransactionsService):
+    transaction = TransactionFactory(account_id=123)
+    service.add_transactions([transaction])
+    moved_transaction = transaction.copy()
+    moved_transaction.transaction_time -= timedelta(days=3)
+    with patch.object(service.collection, "bulk_write", side_effect=RuntimeError):
+        with pytest.raises(RuntimeError):
+            service.add_transactions([moved_transaction])
+    service.add_transactions([moved_transaction])
+    result = list(service.compute_daily_total({"account_id": 123}))
+    assert [total["date"] for total in result] == [
+        moved_transaction.transaction_time.date()
+    ]
+    assert list(service.check_daily_totals()) == []
+
+
+def test_delete_transactions_redelivered(service: TransactionsService):
+    transactions = [TransactionFactory(account_id=123) for _ in range(2)]
+    service.add_transactions(transactions)
+    with patch.object(service.collection, "delete_many", side_effect=RuntimeError):
+        with pytest.raises(RuntimeError):
+            service.delete_transactions([transactions[0].transaction_id])
+    service.delete_transactions([transactions[0].transaction_id])
+    result = list(service.compute_daily_total({"account_id": 123}))
+    assert [total["total_amount"] for total in result] == [transactions[1].amount]
+    assert list(service.check_daily_totals()) == []
+
+
 def test_add_transactions(
     db: Database,
     service: TransactionsService,
@@ -153,3 +448,10 @@ def test_delete_transactions_bulk_not_found(
 ):
     with pytest.raises(NotFound):
         service.delete_transactions([saved_transaction.transaction_id, 123])
+
+
+def test_get_account_ids(service: TransactionsService):
+    transactions = [TransactionFactory(account_id=account_id) for account_id in (1, 2)]
+    service.add_transactions(transactions)
+    transaction_ids = [transaction.transaction_id for transaction in transactions]
+    assert service.get_account_ids([*transaction_ids, 123]) == {1, 2}
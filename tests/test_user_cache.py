@@ -0,0 +1,90 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from redis import Redis
+
+from app.models import User
+from app.services.user_cache import UserCache
+
+from . import factories
+
+
+@pytest.fixture
+def load(user: User):
+    return MagicMock(return_value=user)
+
+
+@pytest.fixture
+def user_cache(cache: Redis):
+    return UserCache(max_size=2, ttl=60, cache=cache, channel="user_cache_test")
+
+
+def test_get_user_loads_once(user_cache: UserCache, user: User, load: MagicMock):
+    assert user_cache.get_user(user.account_id, load) == user
+    assert user_cache.get_user(user.account_id, load) == user
+    load.assert_called_once_with(user.account_id)
+
+
+def test_get_user_expired(user_cache: UserCache, user: User, load: MagicMock):
+    user_cache.ttl = 0
+    user_cache.get_user(user.account_id, load)
+    user_cache.get_user(user.account_id, load)
+    assert load.call_count == 2
+
+
+def test_get_user_evicts_least_recently_used(user_cache: UserCache):
+    users = [factories.UserFactory() for _ in range(3)]
+    users_by_id = {user.account_id: user for user in users}
+    load = MagicMock(side_effect=lambda account_id: users_by_id[account_id])
+    user_cache.get_user(users[0].account_id, load)
+    user_cache.get_user(users[1].account_id, load)
+    user_cache.get_user(users[0].account_id, load)
+    user_cache.get_user(users[2].account_id, load)
+    load.reset_mock()
+    user_cache.get_user(users[0].account_id, load)
+    user_cache.get_user(users[2].account_id, load)
+    load.assert_not_called()
+    user_cache.get_user(users[1].account_id, load)
+    load.assert_called_once_with(users[1].account_id)
+
+
+def test_invalidate(user_cache: UserCache, user: User, load: MagicMock):
+    user_cache.get_user(user.account_id, load)
+    user_cache.invalidate(user.account_id)
+    user_cache.get_user(user.account_id, load)
+    assert load.call_count == 2
+
+
+def test_invalidate_during_load_is_not_cached(user_cache: UserCache, user: User):
+    def load(account_id: int) -> User:
+        user_cache.invalidate(account_id)
+        return user
+
+    load_mock = MagicMock(side_effect=load)
+    user_cache.get_user(user.account_id, load_mock)
+    user_cache.get_user(user.account_id, load_mock)
+    assert load_mock.call_count == 2
+
+
+def test_invalidate_propagates(cache: Redis, user: User, load: MagicMock):
+    publisher = UserCache(max_size=2, ttl=60, cache=cache, channel="user_cache_test")
+    subscriber = UserCache(max_size=2, ttl=60, cache=cache, channel="user_cache_test")
+    subscriber.get_user(user.account_id, load)
+    listener = subscriber.start_listener(sleep_time=0.01)
+    try:
+        while not cache.pubsub_numsub("user_cache_test")[0][1]:
+            time.sleep(0.01)
+        publisher.invalidate(user.account_id)
+        deadline = time.monotonic() + 1
+        while load.call_count < 2 and time.monotonic() < deadline:
+            subscriber.get_user(user.account_id, load)
+            time.sleep(0.01)
+    finally:
+        listener.stop()
+        listener.join()
+    assert load.call_count == 2
+
+
+def test_start_listener_without_channel(cache: Redis):
+    assert UserCache(max_size=2, ttl=60, cache=cache).start_listener() is None
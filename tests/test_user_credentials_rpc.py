@@ -0,0 +1,144 @@
+import json
+from unittest.mock import MagicMock
+
+import pika
+import pytest
+
+from app.config import QueueConfig
+from app.consumers.base import MessageContext
+from app.consumers.user_credentials_rpc import UserCredentialsRpc
+from app.containers import Container
+from app.models import User
+
+
+@pytest.fixture
+def connection():
+    return MagicMock()
+
+
+@pytest.fixture
+def rpc(container: Container, connection: MagicMock):
+    return UserCredentialsRpc(
+        connection,
+        QueueConfig(exchange={"name": "users_exchange"}, name="rpc", bindings=[]),
+        container.users_service(),
+    )
+
+
+@pytest.fixture
+def coalescing_rpc(container: Container, connection: MagicMock):
+    return UserCredentialsRpc(
+        connection,
+        QueueConfig(exchange={"name": "users_exchange"}, name="rpc", bindings=[]),
+        container.users_service(),
+        coalesce_window=0.01,
+        coalesce_max_size=2,
+    )
+
+
+def create_context(body: bytes) -> MessageContext:
+    return MessageContext(
+        channel=MagicMock(),
+        method=MagicMock(),
+        properties=pika.BasicProperties(reply_to="reply", correlation_id="1"),
+        body=body,
+    )
+
+
+def get_response(context: MessageContext) -> dict:
+    return json.loads(context.channel.basic_publish.call_args.kwargs["body"])
+
+
+def test_single_request(rpc: UserCredentialsRpc, saved_user: User):
+    context = create_context(str(saved_user.account_id).encode())
+    rpc.process_message(context)
+    response = get_response(context)
+    assert response == {"success": True, "result": saved_user.credentials.dict()}
+
+
+def test_batch_request(rpc: UserCredentialsRpc, saved_user: User):
+    context = create_context(json.dumps([saved_user.account_id, -1]).encode())
+    rpc.process_message(context)
+    response = get_response(context)
+    assert response == {
+        "success": True,
+        "result": {
+            str(saved_user.account_id): saved_user.credentials.dict(),
+            "-1": None,
+        },
+    }
+
+
+def test_batch_request_too_large(rpc: UserCredentialsRpc):
+    rpc.max_batch_size = 2
+    context = create_context(json.dumps([1, 2, 3]).encode())
+    with pytest.raises(ValueError):
+        rpc.process_message(context)
+    assert get_response(context) == {"success": False, "result": {}}
+    context.channel.basic_ack.assert_called_once()
+
+
+def test_prefetch_set_before_consume(
+    coalescing_rpc: UserCredentialsRpc,
+    connection: MagicMock,
+):
+    channel_calls = [call[0] for call in connection.channel.return_value.mock_calls]
+    assert channel_calls.index("basic_qos") < channel_calls.index("basic_consume")
+    connection.channel.return_value.basic_qos.assert_called_once_with(prefetch_count=2)
+
+
+def test_invalid_request(rpc: UserCredentialsRpc):
+    context = create_context(b'["invalid"]')
+    with pytest.raises(ValueError):
+        rpc.process_message(context)
+    context.channel.basic_reject.assert_called_once()
+
+
+def test_coalesced_requests(
+    coalescing_rpc: UserCredentialsRpc,
+    connection: MagicMock,
+    saved_user: User,
+):
+    found_context = create_context(str(saved_user.account_id).encode())
+    missing_context = create_context(b"-1")
+    coalescing_rpc.process_message(found_context)
+    assert found_context.deferred
+    found_context.channel.basic_publish.assert_not_called()
+    connection.call_later.assert_called_once()
+    coalescing_rpc.process_message(missing_context)
+    assert get_response(found_context) == {
+        "success": True,
+        "result": saved_user.credentials.dict(),
+    }
+    assert get_response(missing_context) == {"success": False, "result": None}
+    found_context.channel.basic_ack.assert_called_once()
+    missing_context.channel.basic_ack.assert_called_once()
+    connection.remove_timeout.assert_called_once()
+
+
+def test_coalesced_requests_response_failure(
+    coalescing_rpc: UserCredentialsRpc,
+    saved_user: User,
+):
+    failed_context = create_context(str(saved_user.account_id).encode())
+    failed_context.channel.basic_publish.side_effect = pika.exceptions.AMQPError
+    context = create_context(b"-1")
+    coalescing_rpc.process_message(failed_context)
+    coalescing_rpc.process_message(context)
+    failed_context.channel.basic_ack.assert_not_called()
+    failed_context.channel.basic_reject.assert_called_once()
+    assert get_response(context) == {"success": False, "result": None}
+    context.channel.basic_ack.assert_called_once()
+
+
+def test_coalesced_requests_flushed_by_timer(
+    coalescing_rpc: UserCredentialsRpc,
+    connection: MagicMock,
+    saved_user: User,
+):
+    context = create_context(str(saved_user.account_id).encode())
+    coalescing_rpc.process_message(context)
+    _, flush = connection.call_later.call_args.args
+    flush()
+    assert get_response(context)["success"]
+    context.channel.basic_ack.assert_called_once()
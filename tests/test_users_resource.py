@@ -1,9 +1,12 @@
+import time
 from http import HTTPStatus
 
 import jwt
 import pytest
 from flask.testing import FlaskClient
+from mongomock import Database
 
+from app.containers import Container
 from app.models import JwtTokenPayload, User, UserSettings
 
 
@@ -70,3 +73,52 @@ def test_update_user(client: FlaskClient, saved_user: User, auth_headers: dict):
     )
     assert response.status_code == HTTPStatus.OK
     assert response.json["subscribed_to_chat"] == settings.subscribed_to_chat
+
+
+def test_get_user_cached(
+    client: FlaskClient, db: Database, saved_user: User, auth_headers: dict
+):
+    client.get(f"/users/{saved_user.account_id}", headers=auth_headers)
+    db.users.delete_one({"account_id": saved_user.account_id})
+    response = client.get(f"/users/{saved_user.account_id}", headers=auth_headers)
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_update_user_invalidates_cache(
+    client: FlaskClient, saved_user: User, auth_headers: dict
+):
+    settings = UserSettings(subscribed_to_chat=not saved_user.subscribed_to_chat)
+    url = f"/users/{saved_user.account_id}"
+    client.get(url, headers=auth_headers)
+    client.put(url, headers=auth_headers, json=settings.dict())
+    response = client.get(url, headers=auth_headers)
+    assert response.json["subscribed_to_chat"] == settings.subscribed_to_chat
+
+
+def test_get_user_expired_token(client: FlaskClient, saved_user: User):
+    token = jwt.encode(
+        {"account_id": saved_user.account_id, "exp": int(time.time()) - 1},
+        saved_user.token,
+    )
+    response = client.get(
+        f"/users/{saved_user.account_id}",
+        headers={"authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_get_user_changed_token(
+    client: FlaskClient,
+    container: Container,
+    db: Database,
+    saved_user: User,
+    auth_headers: dict,
+):
+    url = f"/users/{saved_user.account_id}"
+    client.get(url, headers=auth_headers)
+    db.users.update_one(
+        {"account_id": saved_user.account_id}, {"$set": {"token": "changed"}}
+    )
+    container.user_cache().invalidate(saved_user.account_id)
+    response = client.get(url, headers=auth_headers)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
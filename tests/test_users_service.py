@@ -1,12 +1,14 @@
 import pytest
 from mongomock import Database
+from pymongo.database import Database as PymongoDatabase
 
 from app.containers import Container
-from app.models import User
+from app.models import Recipient, User
 from app.services.exceptions import AlreadyExists, NotFound
 from app.services.users import UsersService
 
 from .factories import UserFactory
+from .query_plans import winning_plan_stages
 
 
 @pytest.fixture
@@ -44,6 +46,61 @@ def test_filter_users(
         assert user.subscribed_to_chat
 
 
+def test_iter_recipients(
+    db: Database,
+    service: UsersService,
+):
+    users = [UserFactory(subscribed_to_chat=i % 2) for i in range(10)]
+    db.users.insert_many(user.dict() for user in users)
+    result = list(service.iter_recipients({"subscribed_to_chat": True}, batch_size=2))
+    assert result == [
+        Recipient(account_id=user.account_id, email=user.email)
+        for user in users
+        if user.subscribed_to_chat
+    ]
+
+
+def test_iter_recipients_projection(service: UsersService, saved_user: User):
+    recipient = next(service.iter_recipients({}))
+    assert recipient.dict() == {
+        "account_id": saved_user.account_id,
+        "email": saved_user.email,
+    }
+
+
+def test_get_account_ids(db: Database, service: UsersService):
+    users = [UserFactory(subscribed_to_predictions=i % 2) for i in range(4)]
+    db.users.insert_many(user.dict() for user in users)
+    result = service.get_account_ids({"subscribed_to_predictions": True})
+    assert list(result) == [users[1].account_id, users[3].account_id]
+
+
+def test_indexes(db: Database, service: UsersService):
+    index_names = db.users.index_information()
+    assert "subscribed_to_chat_1_account_id_1" in index_names
+    assert "subscribed_to_predictions_1_account_id_1" in index_names
+
+
+@pytest.mark.parametrize(
+    "subscription", ["subscribed_to_chat", "subscribed_to_predictions"]
+)
+def test_subscription_query_uses_partial_index(
+    mongo_db: PymongoDatabase,
+    subscription: str,
+):
+    service = UsersService(mongo_db)
+    service.ensure_indexes()
+    mongo_db.users.insert_many(
+        UserFactory(**{subscription: i % 10 == 0}).dict() for i in range(100)
+    )
+    explain = service.collection.find(
+        {subscription: True}, {"account_id": 1, "email": 1, "_id": 0}
+    ).explain()
+    stages = winning_plan_stages(explain)
+    assert "IXSCAN" in stages
+    assert "COLLSCAN" not in stages
+
+
 def test_create_user(
     db: Database,
     service: UsersService,
@@ -92,3 +149,58 @@ def test_delete_user(
 def test_delete_user_not_found(service: UsersService):
     with pytest.raises(NotFound):
         service.delete_user(123)
+
+
+def test_get_credentials(db: Database, service: UsersService, saved_user: User):
+    assert service.get_credentials(saved_user.account_id) == saved_user.credentials
+    db.users.delete_one({"account_id": saved_user.account_id})
+    assert service.get_credentials(saved_user.account_id) == saved_user.credentials
+
+
+def test_get_credentials_not_found(service: UsersService):
+    with pytest.raises(NotFound):
+        service.get_credentials(123)
+
+
+def test_get_credentials_after_create(db: Database, service: UsersService, user: User):
+    service.create_user(user)
+    db.users.delete_one({"account_id": user.account_id})
+    assert service.get_credentials(user.account_id) == user.credentials
+
+
+def test_get_credentials_after_delete(service: UsersService, saved_user: User):
+    service.get_credentials(saved_user.account_id)
+    service.delete_user(saved_user.account_id)
+    with pytest.raises(NotFound):
+        service.get_credentials(saved_user.account_id)
+
+
+def test_get_credentials_not_cached_after_delete(
+    container: Container,
+    db: Database,
+    service: UsersService,
+    saved_user: User,
+):
+    stale_credentials = service.get_user_by_id(saved_user.account_id).credentials
+    service.delete_user(saved_user.account_id)
+    container.credentials_cache().set(stale_credentials)
+    with pytest.raises(NotFound):
+        service.get_credentials(saved_user.account_id)
+
+
+def test_get_credentials_many(
+    container: Container,
+    db: Database,
+    service: UsersService,
+):
+    users = [UserFactory() for _ in range(3)]
+    for user in users[1:]:
+        service.create_user(user)
+    db.users.insert_one(users[0].dict())
+    credentials = service.get_credentials_many(
+        [user.account_id for user in users] + [-1]
+    )
+    assert credentials == {user.account_id: user.credentials for user in users}
+    assert (
+        container.credentials_cache().get(users[0].account_id) == users[0].credentials
+    )